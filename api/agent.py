@@ -1,11 +1,13 @@
-import json, os, datetime as dt
-from typing import Any, Dict, List
+import json, os, re, asyncio, datetime as dt
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from zoneinfo import ZoneInfo
 
-from api.llm import llm_complete
-from api.tools_catalog import search_products
+from api.llm import llm_complete, allm_complete, allm_stream
+from api import plan_rules
+from api.tools_catalog import search_products, asearch_products
 from api.scoring import score_products
-from api.tools_places_osm import search_along_route  # you added this in Phase 5B
+from api.tools_places_osm import search_along_route, asearch_along_route  # you added this in Phase 5B
 
 TZ = "America/Phoenix"
 PROFILE_PATH = "data/profile.json"
@@ -33,25 +35,38 @@ Decide:
 3) need_otw_categories[]: zero or more of ['coffee','florist','gift shop','bakery'].
 Return ONLY JSON: {"missing_items":[],"catalog_queries":[],"need_otw_categories":[]}"""
 
+_DEFAULT_PROFILE = {
+    "user_role": "student",
+    "default_gift_budget": 30,
+    "default_interview_budget": 25,
+    "prime_preferred": True
+}
+
 def _load_profile() -> Dict[str, Any]:
     if os.path.exists(PROFILE_PATH):
         with open(PROFILE_PATH,"r") as f: 
             return json.load(f)
     # defaults
-    return {
-        "user_role": "student",
-        "default_gift_budget": 30,
-        "default_interview_budget": 25,
-        "prime_preferred": True
-    }
+    return dict(_DEFAULT_PROFILE)
+
+def action_profile(profile: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """A stored user's profile over the defaults; None → the single-user data/profile.json."""
+    if profile is None:
+        return _load_profile()
+    # lat/lon are for weather/commute, not the action prompt
+    return {**_DEFAULT_PROFILE, **{k: v for k, v in profile.items() if k not in ("lat", "lon")}}
 
 def _today_iso(tz: str = TZ) -> str:
     return dt.datetime.now(ZoneInfo(tz)).strftime("%Y-%m-%d")
 
-def plan_event(events, weather_brief):
-    sys = "Be terse. Output strict JSON only."
-    usr = json.dumps({"events": events[:6], "weather": weather_brief})
-    out = llm_complete(SCENARIO_PROMPT, usr)
+def _plan_user(events, weather_brief) -> str:
+    return json.dumps({"events": events[:6], "weather": weather_brief})
+
+def _json_obj(out: str) -> bool:
+    """Cache validator: the answer parses as a JSON object (anything else hits a fallback)."""
+    return isinstance(json.loads(out), dict)
+
+def _parse_plan(out: str, events) -> Dict[str, Any]:
     try:
         j = json.loads(out)
         # normalize questions
@@ -68,26 +83,153 @@ def plan_event(events, weather_brief):
             "event_time": (events[0].get("start") if events else None),
             "venue": (events[0].get("location") if events else None),
             "checklist": ["water","charger"],
-            "questions": ["Do you need a coffee on the way?"]
+            "questions": ["Do you need a coffee on the way?"],
+            "fallback": True,  # not the model's answer; callers shouldn't cache it
         }
 
-def decide_actions(plan: Dict[str, Any], answers: Dict[str, Any]) -> Dict[str, Any]:
-    profile = _load_profile()
-    payload = {
+def _rule_plan(events, weather_brief, tz: str = TZ) -> Optional[Dict[str, Any]]:
+    """Deterministic plan when the events clearly match a scenario (counted for hit ratio)."""
+    plan = plan_rules.rule_plan(events, weather_brief, tz)
+    plan_rules.record(plan is not None)
+    return plan
+
+def plan_event(events, weather_brief, fresh: bool = False, tz: str = TZ):
+    plan = _rule_plan(events, weather_brief, tz)
+    if plan:
+        return plan
+    out = llm_complete(SCENARIO_PROMPT, _plan_user(events, weather_brief), bypass_cache=fresh,
+                       validate=_json_obj)
+    return _parse_plan(out, events)
+
+async def aplan_event(events, weather_brief, fresh: bool = False, tz: str = TZ):
+    plan = _rule_plan(events, weather_brief, tz)
+    if plan:
+        return plan
+    out = await allm_complete(SCENARIO_PROMPT, _plan_user(events, weather_brief), bypass_cache=fresh,
+                              validate=_json_obj)
+    return _parse_plan(out, events)
+
+# ── Streaming plan ────────────────────────────────────────────────────────────
+_JSTR = r'"(?:[^"\\]|\\.)*"'
+_PLAN_SCALARS = ("scenario", "event_title", "event_time", "venue")
+_PLAN_LISTS = ("checklist", "questions")
+
+class _PlanStream:
+    """
+    Incremental view over a JSON plan being generated token by token.
+    feed() returns the fields completed since the last call: scalars once their
+    value closes, list items one by one as each top-level array element closes
+    (string and bracket depth are tracked, so "]" inside an item or object-shaped
+    questions don't break the list).
+    """
+    def __init__(self):
+        self.buf = ""
+        self._sent: set = set()
+        # per list: scan position, element start, depth, in-string, escape, done
+        self._lists: Dict[str, Dict[str, Any]] = {}
+
+    def feed(self, delta: str) -> List[Dict[str, Any]]:
+        self.buf += delta
+        out: List[Dict[str, Any]] = []
+        for k in _PLAN_SCALARS:
+            if k in self._sent:
+                continue
+            m = re.search(rf'"{k}"\s*:\s*({_JSTR}|null)', self.buf)
+            if m:
+                self._sent.add(k)
+                out.append({"field": k, "value": json.loads(m.group(1))})
+        for k in _PLAN_LISTS:
+            st = self._lists.get(k)
+            if st is None:
+                m = re.search(rf'"{k}"\s*:\s*\[', self.buf)
+                if not m:
+                    continue
+                st = self._lists[k] = {"pos": m.end(), "start": m.end(), "depth": 1,
+                                       "str": False, "esc": False, "done": False}
+            if not st["done"]:
+                out.extend({"field": k, "item": item} for item in self._scan(k, st))
+        return out
+
+    def _scan(self, k: str, st: Dict[str, Any]) -> List[Any]:
+        items, buf = [], self.buf
+        for i in range(st["pos"], len(buf)):
+            ch = buf[i]
+            if st["str"]:
+                if st["esc"]:
+                    st["esc"] = False
+                elif ch == "\\":
+                    st["esc"] = True
+                elif ch == '"':
+                    st["str"] = False
+            elif ch == '"':
+                st["str"] = True
+            elif ch in "[{":
+                st["depth"] += 1
+            elif ch in "]}":
+                st["depth"] -= 1
+            if st["depth"] == 1 and not st["str"] and ch == "," or st["depth"] == 0:
+                item = self._item(k, buf[st["start"]:i])
+                if item is not None:
+                    items.append(item)
+                st["start"] = i + 1
+                if st["depth"] == 0:
+                    st["done"] = True
+                    st["pos"] = i + 1
+                    return items
+        st["pos"] = len(buf)
+        return items
+
+    @staticmethod
+    def _item(k: str, raw: str) -> Any:
+        raw = raw.strip()
+        if not raw:
+            return None
+        try:
+            v = json.loads(raw)
+        except ValueError:
+            return None
+        if isinstance(v, dict):  # questions as {"id":..,"text":..}, as _parse_plan normalizes
+            return v.get("text")
+        return v if isinstance(v, str) else str(v)
+
+async def aplan_event_stream(events, weather_brief, fresh: bool = False,
+                             tz: str = TZ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Streaming twin of aplan_event: yields ("field", {...}) as plan fields complete,
+    then ("plan", plan) with the same normalized plan aplan_event would return.
+    """
+    plan = _rule_plan(events, weather_brief, tz)
+    if plan:
+        for k in _PLAN_SCALARS:
+            yield "field", {"field": k, "value": plan.get(k)}
+        for k in _PLAN_LISTS:
+            for item in plan.get(k, []):
+                yield "field", {"field": k, "item": item}
+        yield "plan", plan
+        return
+    ps = _PlanStream()
+    async for delta in allm_stream(SCENARIO_PROMPT, _plan_user(events, weather_brief), bypass_cache=fresh,
+                                   validate=_json_obj):
+        for f in ps.feed(delta):
+            yield "field", f
+    yield "plan", _parse_plan(ps.buf.strip(), events)
+
+def _action_payload(plan: Dict[str, Any], answers: Dict[str, Any], profile: Dict[str, Any], tz: str = TZ) -> str:
+    return json.dumps({
         "scenario": plan.get("scenario"),
         "event_time": plan.get("event_time"),
         "venue": plan.get("venue"),
         "answers": answers,
         "profile": profile,
-        "today": _today_iso()
-    }
-    sys = "Return strict JSON only."
-    out = llm_complete(ACTION_PROMPT, json.dumps(payload))
+        "today": _today_iso(tz)
+    })
+
+def _parse_actions(out: str, profile: Dict[str, Any], tz: str = TZ) -> Dict[str, Any]:
     try:
         return json.loads(out)
     except Exception:
         # fallback: typical interview case
-        deadline = _today_iso()
+        deadline = _today_iso(tz)
         return {
             "missing_items": ["belt"],
             "catalog_queries": [{
@@ -97,32 +239,169 @@ def decide_actions(plan: Dict[str, Any], answers: Dict[str, Any]) -> Dict[str, A
                 "deadline": deadline,
                 "prime_only": True
             }],
-            "need_otw_categories": ["coffee"]
+            "need_otw_categories": ["coffee"],
+            "fallback": True,
         }
 
+def decide_actions(plan: Dict[str, Any], answers: Dict[str, Any],
+                   profile: Optional[Dict[str, Any]] = None, tz: str = TZ) -> Dict[str, Any]:
+    profile = action_profile(profile)
+    out = llm_complete(ACTION_PROMPT, _action_payload(plan, answers, profile, tz), validate=_json_obj)
+    return _parse_actions(out, profile, tz)
+
+async def adecide_actions(plan: Dict[str, Any], answers: Dict[str, Any],
+                          profile: Optional[Dict[str, Any]] = None, tz: str = TZ) -> Dict[str, Any]:
+    profile = action_profile(profile)
+    out = await allm_complete(ACTION_PROMPT, _action_payload(plan, answers, profile, tz), validate=_json_obj)
+    return _parse_actions(out, profile, tz)
+
+def _top_pick(raw: List[Dict[str, Any]], spec: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    scored = score_products(raw, spec.get("q",""))
+    if not scored:
+        return None
+    top = scored[0]
+    top["for_item"] = spec.get("item")
+    return top
+
+# ── Lookups ───────────────────────────────────────────────────────────────────
+ACT_DEADLINE_SEC = float(os.getenv("ACT_DEADLINE_SEC", "8"))  # shared by all product/OTW lookups
+_MAX_PRODUCT_QUERIES = 2  # keep it tight
+_MAX_OTW_CATEGORIES = 2
+_MAX_OTW_RESULTS = 4
+
+def _product_lookup(spec: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    raw = search_products(
+        spec.get("q",""),
+        budget=spec.get("budget"),
+        deadline_iso=spec.get("deadline"),
+        prime_only=bool(spec.get("prime_only", True)),
+    )
+    return _top_pick(raw, spec)
+
+async def _aproduct_lookup(spec: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    raw = await asearch_products(
+        spec.get("q",""),
+        budget=spec.get("budget"),
+        deadline_iso=spec.get("deadline"),
+        prime_only=bool(spec.get("prime_only", True)),
+    )
+    return _top_pick(raw, spec)
+
+def _otw_lookup(c: str, home: Dict[str,float], office: Dict[str,float]) -> List[Dict[str, Any]]:
+    return [{"category": c, **it} for it in search_along_route(c, home, office)]
+
+async def _aotw_lookup(c: str, home: Dict[str,float], office: Dict[str,float]) -> List[Dict[str, Any]]:
+    return [{"category": c, **it} for it in await asearch_along_route(c, home, office)]
+
+def _lookup_jobs(actions: Dict[str, Any], use_otw: bool) -> List[tuple]:
+    """(kind, label, arg) for every product spec and OTW category we'll look up."""
+    specs = actions.get("catalog_queries", [])[:_MAX_PRODUCT_QUERIES]
+    cats = (actions.get("need_otw_categories", []) if use_otw else [])[:_MAX_OTW_CATEGORIES]
+    return ([("product", spec.get("item") or spec.get("q"), spec) for spec in specs] +
+            [("otw", c, c) for c in cats])
+
+def _collect(jobs: List[tuple], outcomes: List[tuple]) -> tuple:
+    """outcomes[i] = ("ok", value) | ("error", msg) | ("timeout", None), aligned with jobs."""
+    recs, otw, skipped = [], [], []
+    for (kind, label, _), (status, value) in zip(jobs, outcomes):
+        if status != "ok":
+            skipped.append({"kind": kind, "for": label, "reason": status if status == "timeout" else value})
+        elif kind == "product" and value:
+            recs.append(value)
+        elif kind == "otw":
+            otw.extend(value)
+    return recs, otw[:_MAX_OTW_RESULTS], skipped
+
+def lookup_all(actions: Dict[str, Any], use_otw: bool, home: Dict[str,float], office: Dict[str,float],
+               deadline_sec: float = ACT_DEADLINE_SEC) -> tuple:
+    """
+    Run every product spec and OTW category concurrently under one deadline.
+    Returns (recs, otw, skipped); lookups that failed or missed the deadline are
+    listed in skipped instead of holding up the rest.
+    """
+    jobs = _lookup_jobs(actions, use_otw)
+    if not jobs:
+        return [], [], []
+    pool = ThreadPoolExecutor(max_workers=len(jobs), thread_name_prefix="agent-act")
+    try:
+        futs = [pool.submit(_product_lookup, arg) if kind == "product" else pool.submit(_otw_lookup, arg, home, office)
+                for kind, _, arg in jobs]
+        wait(futs, timeout=deadline_sec)
+        outcomes = []
+        for f in futs:
+            if not f.done():
+                outcomes.append(("timeout", None))
+            elif f.exception() is not None:
+                outcomes.append(("error", str(f.exception()) or type(f.exception()).__name__))
+            else:
+                outcomes.append(("ok", f.result()))
+    finally:
+        # don't wait on a stuck lookup; its result is simply dropped
+        pool.shutdown(wait=False, cancel_futures=True)
+    return _collect(jobs, outcomes)
+
+async def alookup_all(actions: Dict[str, Any], use_otw: bool, home: Dict[str,float], office: Dict[str,float],
+                      deadline_sec: float = ACT_DEADLINE_SEC) -> tuple:
+    """Async twin of lookup_all; unfinished lookups are cancelled at the deadline."""
+    jobs = _lookup_jobs(actions, use_otw)
+    if not jobs:
+        return [], [], []
+    tasks = [asyncio.ensure_future(_aproduct_lookup(arg) if kind == "product" else _aotw_lookup(arg, home, office))
+             for kind, _, arg in jobs]
+    await asyncio.wait(tasks, timeout=deadline_sec)
+    outcomes = []
+    for t in tasks:
+        if not t.done():
+            t.cancel()
+            outcomes.append(("timeout", None))
+        elif t.exception() is not None:
+            outcomes.append(("error", str(t.exception()) or type(t.exception()).__name__))
+        else:
+            outcomes.append(("ok", t.result()))
+    return _collect(jobs, outcomes)
+
 def find_products(qspecs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    out = []
-    for spec in qspecs[:2]:  # keep it tight
-        raw = search_products(
-            spec.get("q",""),
-            budget=spec.get("budget"),
-            deadline_iso=spec.get("deadline"),
-            prime_only=bool(spec.get("prime_only", True)),
-        )
-        scored = score_products(raw, spec.get("q",""))
-        if scored:
-            top = scored[0]
-            top["for_item"] = spec.get("item")
-            out.append(top)
-    return out
+    return lookup_all({"catalog_queries": qspecs}, False, {}, {})[0]
+
+async def afind_products(qspecs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return (await alookup_all({"catalog_queries": qspecs}, False, {}, {}))[0]
 
 def find_otw(categories: List[str], home: Dict[str,float], office: Dict[str,float]) -> List[Dict[str, Any]]:
-    res = []
-    for c in categories[:2]:
-        try:
-            items = search_along_route(c, home, office)
-            for it in items:
-                res.append({"category": c, **it})
-        except Exception:
-            continue
-    return res[:4]
+    return lookup_all({"need_otw_categories": categories}, True, home, office)[1]
+
+async def afind_otw(categories: List[str], home: Dict[str,float], office: Dict[str,float]) -> List[Dict[str, Any]]:
+    return (await alookup_all({"need_otw_categories": categories}, True, home, office))[1]
+
+def _act_payload(plan: Dict[str, Any], actions: Dict[str, Any], recs: List[Dict[str, Any]],
+                 otw: List[Dict[str, Any]], skipped: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "scenario": plan.get("scenario"),
+        "event_title": plan.get("event_title"),
+        "event_time": plan.get("event_time"),
+        "venue": plan.get("venue"),
+        "checklist": plan.get("checklist", []),
+        "questions": plan.get("questions", []),
+        "recommendations": recs,
+        "otw": otw,
+        "skipped": skipped,
+        "actions": actions
+    }
+
+def act(plan: Dict[str, Any], answers: Dict[str, Any], use_otw: bool,
+        home: Dict[str, float], office: Dict[str, float],
+        profile: Optional[Dict[str, Any]] = None, tz: str = TZ) -> Dict[str, Any]:
+    """
+    decide_actions → product picks + OTW stops. Shared by /agent/act and the Daily Brief;
+    profile/tz are a stored user's (None → data/profile.json).
+    """
+    actions = decide_actions(plan, answers, profile, tz)
+    recs, otw, skipped = lookup_all(actions, use_otw, home, office)
+    return _act_payload(plan, actions, recs, otw, skipped)
+
+async def aact(plan: Dict[str, Any], answers: Dict[str, Any], use_otw: bool,
+               home: Dict[str, float], office: Dict[str, float],
+               profile: Optional[Dict[str, Any]] = None, tz: str = TZ) -> Dict[str, Any]:
+    """Async twin of act()."""
+    actions = await adecide_actions(plan, answers, profile, tz)
+    recs, otw, skipped = await alookup_all(actions, use_otw, home, office)
+    return _act_payload(plan, actions, recs, otw, skipped)
@@ -1,92 +1,264 @@
 # api/brief.py
-import os, json, datetime as dt
+import os, json, time, hashlib, threading, datetime as dt
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
 from zoneinfo import ZoneInfo
-from typing import Dict, Any, List, Tuple
-import requests
+from typing import Dict, Any, List, Optional, Tuple, Callable
+from api import http_client, users
 
-API_BASE = os.getenv("BRIEF_API_BASE", "http://127.0.0.1:8000")  # call our own API
+from api.config import load_profile_coords, load_commute_cfg
+from api.tools_weather import get_weather
+from api.tools_commute import get_commute
+from api.tools_calendar import get_events_today_and_tomorrow, upsert_reminder
+from api.agent import plan_event, act, action_profile
+
+API_BASE = os.getenv("BRIEF_API_BASE", "http://127.0.0.1:8000")  # only used in http mode
+# "inproc" (default): call the tool functions directly.
+# "http": loop back through our own API (opt-in, e.g. when the brief runs in a separate process).
+BRIEF_MODE = os.getenv("BRIEF_MODE", "inproc").lower()
 TZ = os.getenv("BRIEF_TZ", "America/Phoenix")
 
+# Per-source budgets for the concurrent input fan-out; a source that misses its
+# budget (or errors) degrades to an empty value instead of failing the brief.
+INPUT_TIMEOUTS_SEC = {
+    "weather": float(os.getenv("BRIEF_WEATHER_TIMEOUT_SEC", "12")),
+    "commute": float(os.getenv("BRIEF_COMMUTE_TIMEOUT_SEC", "15")),
+    "events":  float(os.getenv("BRIEF_EVENTS_TIMEOUT_SEC", "15")),
+}
+# Long-lived, so per-thread clients (the Calendar discovery client in tools_calendar)
+# survive between briefs instead of being rebuilt every run.
+_input_pool = ThreadPoolExecutor(max_workers=int(os.getenv("BRIEF_INPUT_WORKERS", "8")),
+                                 thread_name_prefix="brief-input")
+
+# Prefetch: run the slow stages (inputs, plan, act) this many minutes before the
+# brief; at brief time only the commute ETA is refreshed and the report re-rendered.
+BRIEF_PREFETCH_MIN = int(os.getenv("BRIEF_PREFETCH_MIN", "15"))  # 0 disables
+BRIEF_PREFETCH_MAX_AGE_MIN = int(os.getenv("BRIEF_PREFETCH_MAX_AGE_MIN", "90"))
+
 REPORT_DIR = "data/reports"
 os.makedirs(REPORT_DIR, exist_ok=True)
 
-def _today_local() -> dt.datetime:
-    return dt.datetime.now(ZoneInfo(TZ))
+def _today_local(tz: str = TZ) -> dt.datetime:
+    return dt.datetime.now(ZoneInfo(tz))
+
+def _context(user: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Where one brief reads its inputs and writes its report: a stored user
+    (api.users) or, for user=None, the single-user data/*.json files.
+    """
+    if user is None:
+        return {"user_id": None, "tz": TZ, "profile": None, "commute": None,
+                "token_path": None, "report_dir": REPORT_DIR}
+    uid = user["user_id"]
+    return {"user_id": uid, "tz": user.get("tz") or TZ, "profile": user.get("profile") or {},
+            "commute": user.get("commute"), "token_path": users.token_path(uid),
+            "report_dir": os.path.join(REPORT_DIR, uid)}
+
+def _coords(ctx: Dict[str, Any]) -> Tuple[float, float]:
+    if ctx["profile"] is None:
+        return load_profile_coords()
+    p = ctx["profile"]
+    return float(p.get("lat", os.getenv("DEFAULT_LAT", "33.424"))), float(p.get("lon", os.getenv("DEFAULT_LON", "-111.928")))
+
+def _commute_cfg(ctx: Dict[str, Any]) -> Dict[str, Any]:
+    if ctx["commute"] is None:
+        if ctx["user_id"] is not None:
+            raise ValueError("commute not configured")
+        return load_commute_cfg()
+    return ctx["commute"]
+
+def _use_http(ctx: Optional[Dict[str, Any]] = None) -> bool:
+    # the loopback API only knows the single-user config; per-user briefs always run in-process
+    return BRIEF_MODE == "http" and (ctx is None or ctx["user_id"] is None)
+
+def _elapsed_ms(t0: float) -> int:
+    return int((time.perf_counter() - t0) * 1000)
 
 def _get(url: str, **kw):
-    r = requests.get(url, timeout=kw.pop("timeout", 15))
+    r = http_client.get(url, timeout=kw.pop("timeout", 15))
     r.raise_for_status()
     return r.json()
 
 def _post(url: str, json_body: Dict[str, Any], **kw):
-    r = requests.post(url, json=json_body, timeout=kw.pop("timeout", 30))
+    r = http_client.post(url, json=json_body, timeout=kw.pop("timeout", 30))
     r.raise_for_status()
     return r.json()
 
-def fetch_inputs() -> Dict[str, Any]:
-    weather = _get(f"{API_BASE}/weather")
-    commute = _get(f"{API_BASE}/commute")
-    # If Calendar is disabled upstream, this will return {"events":[]}
-    events  = _get(f"{API_BASE}/calendar/events").get("events", [])
-
+def _weather_brief(weather: Dict[str, Any]) -> str:
     # Small, readable weather brief
     hourly = weather.get("hourly", [])
-    wbrief = ""
-    if hourly:
-        h0 = hourly[0]
-        wbrief = f"Now {h0.get('temp','?')}°F · UV {h0.get('uv','?')} · Rain {h0.get('precip_prob','?')}%"
+    if not hourly:
+        return ""
+    h0 = hourly[0]
+    return f"Now {h0.get('temp','?')}°F · UV {h0.get('uv','?')} · Rain {h0.get('precip_prob','?')}%"
+
+def _fetch_weather(ctx: Dict[str, Any]) -> Dict[str, Any]:
+    if _use_http(ctx):
+        return _get(f"{API_BASE}/weather")
+    lat, lon = _coords(ctx)
+    payload, latency_ms = get_weather(lat, lon, use_fahrenheit=True)
+    payload["latency_ms"] = latency_ms
+    return payload
+
+def _fetch_commute(ctx: Dict[str, Any], fresh: bool = False) -> Dict[str, Any]:
+    if _use_http(ctx):
+        return _get(f"{API_BASE}/commute")
+    cfg = _commute_cfg(ctx)
+    payload, latency_ms = get_commute(
+        home=cfg["home"],
+        office=cfg["office"],
+        arrive_by_hhmm=cfg["arrive_by"],
+        buffer_minutes=int(cfg.get("buffer_minutes", 10)),
+        fresh=fresh,
+    )
+    payload["latency_ms"] = latency_ms
+    return payload
+
+def _fetch_events(ctx: Dict[str, Any]) -> List[Dict[str, Any]]:
+    if _use_http(ctx):
+        # If Calendar is disabled upstream, this will return {"events":[]}
+        return _get(f"{API_BASE}/calendar/events").get("events", [])
+    return get_events_today_and_tomorrow(ctx["tz"], token_path=ctx["token_path"])
 
-    return {"weather": weather, "commute": commute, "events": events, "weather_brief": wbrief}
+def _empty_input(name: str) -> Any:
+    return [] if name == "events" else {}
 
-def run_planner(events: List[Dict[str, Any]], weather_brief: str) -> Dict[str, Any]:
+def fetch_inputs(ctx: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Fetch weather, commute and events concurrently. Wall time is bounded by the
+    slowest source (capped by INPUT_TIMEOUTS_SEC); failures land in "errors".
+    """
+    ctx = ctx or _context()
+    fetchers = {"weather": _fetch_weather, "commute": _fetch_commute, "events": _fetch_events}
+    out: Dict[str, Any] = {name: _empty_input(name) for name in fetchers}
+    errors: Dict[str, str] = {}
+
+    t0 = time.monotonic()
+    futs = {name: _input_pool.submit(fn, ctx) for name, fn in fetchers.items()}
+    for name, fut in futs.items():
+        remaining = max(0.0, INPUT_TIMEOUTS_SEC[name] - (time.monotonic() - t0))
+        try:
+            out[name] = fut.result(timeout=remaining)
+        except FuturesTimeout:
+            # don't wait on a stuck source; its result is simply dropped
+            fut.cancel()
+            errors[name] = "timeout"
+        except Exception as e:
+            errors[name] = str(e) or type(e).__name__
+
+    out["weather_brief"] = _weather_brief(out["weather"])
+    out["errors"] = errors
+    return out
+
+def run_planner(events: List[Dict[str, Any]], weather_brief: str,
+                ctx: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     try:
-        out = _post(f"{API_BASE}/agent/plan", {"events": events, "weather_brief": weather_brief})
-        return out.get("plan", {}) or {}
+        if _use_http(ctx):
+            out = _post(f"{API_BASE}/agent/plan", {"events": events, "weather_brief": weather_brief})
+            return out.get("plan", {}) or {}
+        return plan_event(events, weather_brief, tz=(ctx or {}).get("tz", TZ)) or {}
     except Exception:
         return {}
 
-def run_actions(plan: Dict[str, Any]) -> Dict[str, Any]:
+def run_actions(plan: Dict[str, Any], ctx: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     # We let backend decide: picks + OTW
     try:
-        out = _post(f"{API_BASE}/agent/act", {
-            "plan": plan,
-            "answers": {},     # zero-shot; UI can fill later
-            "use_otw": True
-        })
-        return out
+        if _use_http(ctx):
+            return _post(f"{API_BASE}/agent/act", {
+                "plan": plan,
+                "answers": {},     # zero-shot; UI can fill later
+                "use_otw": True
+            })
+        ctx = ctx or _context()
+        cfg = _commute_cfg(ctx)
+        return act(plan, {}, True, cfg["home"], cfg["office"], profile=ctx["profile"], tz=ctx["tz"])
     except Exception:
         return {"recommendations": [], "otw": []}
 
-def maybe_create_leave_reminder(commute: Dict[str, Any]) -> Dict[str, Any] | None:
-    """Optionally create a 'Leave by' reminder ~cm['leave_by'] with a small buffer."""
+# ── Leave-by reminder ─────────────────────────────────────────────────────────
+# One reminder per user per day under a deterministic Calendar event id, so re-runs
+# update it instead of inserting duplicates. REMINDER_INDEX remembers what we last
+# wrote per id; when nothing changed there's no Calendar call at all.
+REMINDER_INDEX = os.getenv("REMINDER_INDEX_PATH", "data/reminders.json")
+_reminder_lock = threading.Lock()
+
+def _reminder_id(kind: str, day: dt.date, user_id: Optional[str]) -> str:
+    # Calendar ids are base32hex (a-v, 0-9): "lc" + kind + yyyymmdd + hex user hash
+    uh = hashlib.sha1((user_id or "default").encode()).hexdigest()[:8]
+    return f"lc{kind}{day.strftime('%Y%m%d')}{uh}"
+
+def _load_reminder_index() -> Dict[str, Any]:
+    try:
+        with open(REMINDER_INDEX) as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def _save_reminder_index(idx: Dict[str, Any]):
+    os.makedirs(os.path.dirname(REMINDER_INDEX) or ".", exist_ok=True)
+    # drop entries older than a week; ids embed the date so they never come back
+    cutoff = time.time() - 7 * 86400
+    idx = {k: v for k, v in idx.items() if v.get("at", 0) >= cutoff}
+    with open(REMINDER_INDEX + ".tmp", "w") as f:
+        json.dump(idx, f)
+    os.replace(REMINDER_INDEX + ".tmp", REMINDER_INDEX)
+
+def maybe_create_leave_reminder(commute: Dict[str, Any],
+                                ctx: Optional[Dict[str, Any]] = None) -> Dict[str, Any] | None:
+    """
+    Create or update today's 'Leave by' reminder ~cm['leave_by'] with a small buffer.
+    Idempotent: the same leave time → no Calendar call; a new one → update in place.
+    """
+    ctx = ctx or _context()
     try:
         arrive_by = commute.get("arrive_by")  # "HH:MM"
         leave_by  = commute.get("leave_by")   # "HH:MM"
         if not (arrive_by and leave_by):
             return None
-        today = dt.date.today()
-        tz = ZoneInfo(TZ)
+        today = _today_local(ctx["tz"]).date()
+        tz = ZoneInfo(ctx["tz"])
         lh, lm = map(int, leave_by.split(":"))
         leave_dt = dt.datetime(today.year, today.month, today.day, lh, lm, tzinfo=tz)
         when_iso = leave_dt.strftime("%Y-%m-%dT%H:%M")
+        summary = f"Leave by {leave_by}"
+        event_id = _reminder_id("leave", today, ctx["user_id"])
+        fp = _fp(summary, when_iso, ctx["tz"], 0)
+
+        with _reminder_lock:
+            prev = _load_reminder_index().get(event_id)
+        if prev and prev.get("fp") == fp:
+            return {"id": prev.get("id"), "htmlLink": prev.get("htmlLink"), "action": "unchanged"}
 
-        # create reminder via your API (which writes to Calendar if enabled)
-        r = requests.post(f"{API_BASE}/calendar/reminder", json={
-            "summary": f"Leave by {leave_by}",
-            "when": when_iso,
-            "description": "Auto from Daily Brief",
-            "minutes": 0
-        }, timeout=10)
-        if r.ok:
-            return r.json().get("created")
+        if not _use_http(ctx):
+            created = upsert_reminder(event_id, summary, when_iso, "Auto from Daily Brief", 0,
+                                      tz_str=ctx["tz"], token_path=ctx["token_path"], exists=bool(prev))
+        else:
+            # create reminder via your API (which writes to Calendar if enabled)
+            r = http_client.post(f"{API_BASE}/calendar/reminder", json={
+                "summary": summary,
+                "when": when_iso,
+                "description": "Auto from Daily Brief",
+                "minutes": 0,
+                "event_id": event_id,
+                "exists": bool(prev),
+            }, timeout=10)
+            if not r.ok:
+                return None
+            created = r.json().get("created")
+        if created:
+            with _reminder_lock:
+                idx = _load_reminder_index()
+                idx[event_id] = {"fp": fp, "id": created.get("id"), "htmlLink": created.get("htmlLink"),
+                                 "when": when_iso, "at": time.time()}
+                _save_reminder_index(idx)
+        return created
     except Exception:
         return None
-    return None
 
 def render_markdown(data: Dict[str, Any],
                     plan: Dict[str, Any],
-                    act: Dict[str, Any]) -> str:
-    now = _today_local()
+                    act: Dict[str, Any],
+                    tz: str = TZ) -> str:
+    now = _today_local(tz)
     c = data["commute"]
     w = data["weather"]
     events = data["events"]
@@ -96,6 +268,8 @@ def render_markdown(data: Dict[str, Any],
     lines.append("")
     lines.append(f"**Weather:** Now {w.get('temp_now','?')}°F, UV {w.get('uv_now','?')} · {data.get('weather_brief','')}")
     lines.append(f"**Commute:** ETA {c.get('eta_min','?')} min · Leave by {c.get('leave_by','?')} · Arrive by {c.get('arrive_by','?')}")
+    if data.get("errors"):
+        lines.append("_Unavailable: " + ", ".join(f"{k} ({v})" for k, v in data["errors"].items()) + "_")
     lines.append("")
     lines.append("## First 3 events")
     for e in (events or [])[:3]:
@@ -130,33 +304,191 @@ def render_markdown(data: Dict[str, Any],
 
     return "\n".join(lines)
 
-def save_report(md: str) -> str:
-    now = _today_local()
-    path = os.path.join(REPORT_DIR, f"brief-{now.strftime('%Y%m%d')}.md")
+def save_report(md: str, report_dir: str = REPORT_DIR, tz: str = TZ) -> str:
+    now = _today_local(tz)
+    os.makedirs(report_dir, exist_ok=True)
+    path = os.path.join(report_dir, f"brief-{now.strftime('%Y%m%d')}.md")
     with open(path, "w") as f:
         f.write(md)
     return path
 
-def compose_and_optionally_commit(create_leave_event: bool = True) -> Dict[str, Any]:
-    data = fetch_inputs()
-    plan = run_planner(data["events"], data.get("weather_brief",""))
-    act  = run_actions(plan) if plan else {"recommendations": [], "otw": []}
+# ── Stage fingerprints ────────────────────────────────────────────────────────
+# plan/act/render each hash the inputs they depend on; a re-run whose hash matches
+# the last stored one reuses that output (no LLM, catalog or OTW calls, no rewrite).
+_STATE_FILE = ".brief_state.json"
+
+def _fp(*parts: Any) -> str:
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+def _load_state(ctx: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(ctx["report_dir"], _STATE_FILE)) as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def _save_state(ctx: Dict[str, Any], state: Dict[str, Any]):
+    os.makedirs(ctx["report_dir"], exist_ok=True)
+    path = os.path.join(ctx["report_dir"], _STATE_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(path + ".tmp", path)
+
+def _stage(name: str, fp: str, compute: Callable[[], Any], state: Dict[str, Any],
+           stages: Dict[str, str], timings: Dict[str, int], force: bool = False,
+           keep: Callable[[Any], bool] = bool) -> Any:
+    """Reuse state[name] when its fingerprint matches, else compute (and store if keep(out))."""
+    t0 = time.perf_counter()
+    prev = state.get(name)
+    if not force and prev and prev.get("fp") == fp:
+        out = prev["out"]
+        stages[name] = "reused"
+    else:
+        out = compute()
+        stages[name] = "recomputed"
+        if keep(out):
+            state[name] = {"fp": fp, "out": out}
+        else:
+            state.pop(name, None)  # failed/empty output: recompute next time
+    timings[name] = _elapsed_ms(t0)
+    return out
+
+def _plan_fp(ctx: Dict[str, Any], data: Dict[str, Any]) -> str:
+    events = [(e.get("summary"), e.get("start"), e.get("end"), e.get("location")) for e in data["events"]]
+    return _fp(_today_local(ctx["tz"]).date().isoformat(), events, data.get("weather_brief", ""))
+
+def _act_fp(ctx: Dict[str, Any], plan: Dict[str, Any]) -> str:
+    try:
+        cfg = _commute_cfg(ctx)
+        route = (cfg.get("home"), cfg.get("office"))
+    except Exception:
+        route = None
+    # budgets/preferences shape the action prompt, so a profile edit invalidates the stage
+    return _fp(_today_local(ctx["tz"]).date().isoformat(), plan, route, action_profile(ctx["profile"]))
+
+def _render_fp(ctx: Dict[str, Any], data: Dict[str, Any], plan: Dict[str, Any], act_: Dict[str, Any]) -> str:
+    w, c = data["weather"], data["commute"]
+    return _fp(_today_local(ctx["tz"]).date().isoformat(),
+               (w.get("temp_now"), w.get("uv_now"), data.get("weather_brief")),
+               (c.get("eta_min"), c.get("leave_by"), c.get("arrive_by")),
+               data.get("errors"), data["events"][:3], plan,
+               (act_ or {}).get("recommendations"), (act_ or {}).get("otw"))
+
+def _run_slow_stages(ctx: Dict[str, Any], timings: Dict[str, int], stages: Dict[str, str],
+                     state: Dict[str, Any], force: bool = False) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+    # inputs are always fetched (they're what the fingerprints are computed from;
+    # weather/commute come through their SWR caches)
+    t0 = time.perf_counter()
+    data = fetch_inputs(ctx)
+    timings["inputs"] = _elapsed_ms(t0)
+    stages["inputs"] = "recomputed"
+
+    plan = _stage("plan", _plan_fp(ctx, data),
+                  lambda: run_planner(data["events"], data.get("weather_brief",""), ctx),
+                  state, stages, timings, force,
+                  keep=lambda out: bool(out) and not out.get("fallback"))  # not the malformed-LLM fallback
+    act_ = _stage("act", _act_fp(ctx, plan),
+                  lambda: run_actions(plan, ctx) if plan else {"recommendations": [], "otw": []},
+                  state, stages, timings, force,
+                  keep=lambda out: (bool(plan) and "actions" in out and not out.get("skipped")
+                                    and not (out.get("actions") or {}).get("fallback")))  # complete results only
+    return data, plan, act_
+
+# ── Prefetch ──────────────────────────────────────────────────────────────────
+_prefetched: Dict[str, Dict[str, Any]] = {}
+_prefetch_lock = threading.Lock()
+
+def prefetch(user: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Run inputs/plan/act ahead of the brief; the next compose for this user picks them up."""
+    ctx = _context(user)
+    timings: Dict[str, int] = {}
+    stages: Dict[str, str] = {}
+    state = _load_state(ctx)
+    data, plan, act_ = _run_slow_stages(ctx, timings, stages, state)
+    _save_state(ctx, state)
+    with _prefetch_lock:
+        _prefetched[ctx["user_id"] or ""] = {
+            "at": time.time(), "day": _today_local(ctx["tz"]).date().isoformat(),
+            "data": data, "plan": plan, "act": act_, "timings": timings,
+        }
+    return {"user_id": ctx["user_id"], "timings_ms": timings, "stages": stages,
+            "degraded": data.get("errors", {})}
+
+def _take_prefetched(ctx: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Pop this user's prefetched stages if they're from today and not too old."""
+    with _prefetch_lock:
+        pre = _prefetched.pop(ctx["user_id"] or "", None)
+    if not pre or pre["day"] != _today_local(ctx["tz"]).date().isoformat():
+        return None
+    if time.time() - pre["at"] > BRIEF_PREFETCH_MAX_AGE_MIN * 60:
+        return None
+    return pre
+
+def compose_and_optionally_commit(create_leave_event: bool = True,
+                                  user: Optional[Dict[str, Any]] = None,
+                                  use_prefetch: bool = True,
+                                  force: bool = False) -> Dict[str, Any]:
+    """
+    Compose one brief; user is a stored api.users config (None = single-user data/ files).
+    With a prefetched run available, only the commute is re-fetched (bypassing its
+    cache, traffic moves) before the leave reminder and render.
+    Otherwise plan/act/render are reused when their input fingerprints match the
+    last run (force=True recomputes everything); "stages" reports which ran.
+    """
+    ctx = _context(user)
+    timings: Dict[str, int] = {}
+    stages: Dict[str, str] = {}
+    state = _load_state(ctx)
+
+    pre = _take_prefetched(ctx) if use_prefetch and not force else None
+    if pre:
+        data, plan, act_ = dict(pre["data"]), pre["plan"], pre["act"]
+        errors = dict(data.get("errors", {}))
+        t0 = time.perf_counter()
+        try:
+            data["commute"] = _fetch_commute(ctx, fresh=True)
+            errors.pop("commute", None)
+        except Exception as e:
+            # keep the prefetched ETA rather than none at all
+            errors["commute"] = f"refresh failed, using prefetched ETA: {e}"
+        data["errors"] = errors
+        timings["commute_refresh"] = _elapsed_ms(t0)
+        stages.update(inputs="prefetched", plan="prefetched", act="prefetched")
+        prefetched = {"age_sec": int(time.time() - pre["at"]), "timings_ms": pre["timings"]}
+    else:
+        data, plan, act_ = _run_slow_stages(ctx, timings, stages, state, force)
+        prefetched = None
 
     created = None
     if create_leave_event:
-        created = maybe_create_leave_reminder(data["commute"])
+        t0 = time.perf_counter()
+        created = maybe_create_leave_reminder(data["commute"], ctx)
+        timings["leave_reminder"] = _elapsed_ms(t0)
 
-    md = render_markdown(data, plan, act)
-    path = save_report(md)
+    def _render() -> Dict[str, Any]:
+        md = render_markdown(data, plan, act_, ctx["tz"])
+        return {"md": md, "path": save_report(md, ctx["report_dir"], ctx["tz"])}
+    prev_path = (state.get("render") or {}).get("out", {}).get("path")
+    rendered = _stage("render", _render_fp(ctx, data, plan, act_), _render, state, stages, timings,
+                      force or not (prev_path and os.path.exists(prev_path)))
+    md, path = rendered["md"], rendered["path"]
+    _save_state(ctx, state)
+    timings["total"] = sum(timings.values())
     return {
+        "user_id": ctx["user_id"],
         "report_path": path,
         "report_md": md,
         "created_leave": created,
         "plan": plan,
-        "act": act,
+        "act": act_,
         "inputs": {
             "weather": {"temp_now": data["weather"].get("temp_now"), "uv_now": data["weather"].get("uv_now")},
             "commute": data["commute"],
             "events": data["events"][:3],
-        }
-    }
\ No newline at end of file
+        },
+        "degraded": data.get("errors", {}),
+        "mode": "http" if _use_http(ctx) else "inproc",
+        "prefetched": prefetched,
+        "stages": stages,
+        "timings_ms": timings,
+    }
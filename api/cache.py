@@ -0,0 +1,330 @@
+# api/cache.py
+"""
+Caches shared by the tools.
+
+TieredCache: in-memory LRU in front of a JSON-file disk tier (catalog, places).
+- TTL checked on read; a background sweeper also deletes expired files
+- disk tier bounded by entry count and total bytes (oldest written evicted first)
+- atomic writes (temp file + os.replace), so readers never see half a file
+
+SWRCache: in-memory stale-while-revalidate cache (weather, commute).
+
+Both keep per-cache counters, see all_stats().
+"""
+import os, re, json, copy, time, asyncio, hashlib, tempfile, threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+CACHE_SWEEP_SEC = float(os.getenv("CACHE_SWEEP_SEC", "300"))
+
+_registry: Dict[str, Any] = {}
+_registry_lock = threading.Lock()
+_sweeper: Optional[threading.Thread] = None
+
+_MISSING = object()
+
+class TieredCache:
+    def __init__(self, name: str, directory: str, ttl_sec: float,
+                 max_entries: int = 2000, max_bytes: int = 50 * 1024 * 1024, mem_entries: int = 256):
+        self.name = name
+        self.directory = directory
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.mem_entries = mem_entries
+        self._mem: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._disk: Optional[Dict[str, Tuple[float, int]]] = None  # fname → (mtime, size), loaded lazily
+        self._lock = threading.RLock()
+        self.counters = {"mem_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "expired": 0, "evictions": 0}
+        with _registry_lock:
+            _registry[name] = self
+        _ensure_sweeper()
+
+    # ── keys / files ──────────────────────────────────────────────────────────
+    @staticmethod
+    def _fname(key: str) -> str:
+        safe = re.sub(r"[^A-Za-z0-9._-]+", "_", key)
+        if safe != key or len(safe) > 120:
+            safe = hashlib.sha1(key.encode()).hexdigest()[:24]
+        return safe + ".json"
+
+    def _path(self, fname: str) -> str:
+        return os.path.join(self.directory, fname)
+
+    def _index(self) -> Dict[str, Tuple[float, int]]:
+        if self._disk is None:
+            idx: Dict[str, Tuple[float, int]] = {}
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                for e in os.scandir(self.directory):
+                    if e.is_file() and e.name.endswith(".json"):
+                        st = e.stat()
+                        idx[e.name] = (st.st_mtime, st.st_size)
+            except Exception:
+                pass
+            self._disk = idx
+        return self._disk
+
+    def _drop_file(self, fname: str):
+        self._index().pop(fname, None)
+        try:
+            os.remove(self._path(fname))
+        except OSError:
+            pass
+
+    # ── API ───────────────────────────────────────────────────────────────────
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            hit = self._mem.get(key, _MISSING)
+            if hit is not _MISSING:
+                stored_at, value = hit
+                if now - stored_at <= self.ttl_sec:
+                    self._mem.move_to_end(key)
+                    self.counters["mem_hits"] += 1
+                    return value
+                del self._mem[key]
+
+            fname = self._fname(key)
+            meta = self._index().get(fname)
+            if meta is None:
+                self.counters["misses"] += 1
+                return None
+            if now - meta[0] > self.ttl_sec:
+                self._drop_file(fname)
+                self.counters["expired"] += 1
+                self.counters["misses"] += 1
+                return None
+        try:
+            with open(self._path(fname), "r") as f:
+                value = json.load(f)
+        except Exception:
+            with self._lock:
+                self._drop_file(fname)
+                self.counters["misses"] += 1
+            return None
+        with self._lock:
+            self.counters["disk_hits"] += 1
+            self._remember(key, meta[0], value)
+        return value
+
+    def set(self, key: str, value: Any):
+        fname = self._fname(key)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".tmp-", suffix=".part")
+            with os.fdopen(fd, "w") as f:
+                json.dump(value, f)
+            os.replace(tmp, self._path(fname))
+            st = os.stat(self._path(fname))
+        except Exception:
+            return
+        with self._lock:
+            self._index()[fname] = (st.st_mtime, st.st_size)
+            self._remember(key, st.st_mtime, value)
+            self.counters["writes"] += 1
+            self._enforce_limits()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._mem.pop(key, None)
+            self._drop_file(self._fname(key))
+
+    def _remember(self, key: str, stored_at: float, value: Any):
+        self._mem[key] = (stored_at, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.mem_entries:
+            self._mem.popitem(last=False)
+
+    def _enforce_limits(self):
+        idx = self._index()
+        total = sum(size for _, size in idx.values())
+        if len(idx) <= self.max_entries and total <= self.max_bytes:
+            return
+        for fname, (_, size) in sorted(idx.items(), key=lambda kv: kv[1][0]):
+            if len(idx) <= self.max_entries and total <= self.max_bytes:
+                break
+            self._drop_file(fname)
+            total -= size
+            self.counters["evictions"] += 1
+        # memory tier may still hold evicted keys; they expire by TTL like everything else
+
+    def sweep(self):
+        """Delete expired entries from both tiers and re-apply the size limits."""
+        now = time.time()
+        with self._lock:
+            for k in [k for k, (ts, _) in self._mem.items() if now - ts > self.ttl_sec]:
+                del self._mem[k]
+            for fname in [f for f, (mt, _) in self._index().items() if now - mt > self.ttl_sec]:
+                self._drop_file(fname)
+                self.counters["expired"] += 1
+            self._enforce_limits()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            idx = self._index()
+            lookups = self.counters["mem_hits"] + self.counters["disk_hits"] + self.counters["misses"]
+            hits = self.counters["mem_hits"] + self.counters["disk_hits"]
+            return {
+                **self.counters,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "mem_entries": len(self._mem),
+                "disk_entries": len(idx),
+                "disk_bytes": sum(size for _, size in idx.values()),
+                "limits": {"ttl_sec": self.ttl_sec, "max_entries": self.max_entries, "max_bytes": self.max_bytes},
+            }
+
+class SWRCache:
+    """
+    Stale-while-revalidate: fresh (< soft_ttl) values are served as-is; stale
+    (< hard_ttl) values are served immediately while one background refresh runs;
+    anything older is loaded inline. Concurrent loads of one key share a single call.
+    Values are deep-copied out so callers can't mutate the cached copy.
+    """
+    def __init__(self, name: str, soft_ttl_sec: float, hard_ttl_sec: float, max_entries: int = 512):
+        self.name = name
+        self.soft_ttl_sec = soft_ttl_sec
+        self.hard_ttl_sec = max(hard_ttl_sec, soft_ttl_sec)
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self._ainflight: Dict[tuple, "asyncio.Task[Any]"] = {}
+        self._tasks: set = set()  # keep background refresh tasks referenced
+        self._pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix=f"swr-{name}")
+        self.counters = {"fresh_hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "refresh_errors": 0}
+        with _registry_lock:
+            _registry[name] = self
+
+    def _lookup(self, key: str) -> Tuple[str, Any]:
+        with self._lock:
+            hit = self._data.get(key, _MISSING)
+            if hit is _MISSING:
+                self.counters["misses"] += 1
+                return "miss", None
+            age = time.time() - hit[0]
+            if age <= self.soft_ttl_sec:
+                self.counters["fresh_hits"] += 1
+                return "fresh", hit[1]
+            if age <= self.hard_ttl_sec:
+                self.counters["stale_hits"] += 1
+                return "stale", hit[1]
+            del self._data[key]
+            self.counters["misses"] += 1
+            return "miss", None
+
+    def _store(self, key: str, value: Any):
+        with self._lock:
+            self._data[key] = (time.time(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    # ── sync ──────────────────────────────────────────────────────────────────
+    def _load(self, key: str, loader: Callable[[], Any]) -> Future:
+        """Start (or join) the single in-flight load for key."""
+        with self._lock:
+            fut = self._inflight.get(key)
+            if fut is not None:
+                return fut
+            fut = self._inflight[key] = Future()
+        try:
+            fut.set_result(loader())
+            self._store(key, fut.result())
+        except BaseException as e:
+            fut.set_exception(e)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        return fut
+
+    def _refresh_in_background(self, key: str, loader: Callable[[], Any]):
+        with self._lock:
+            if key in self._inflight:
+                return
+            self.counters["refreshes"] += 1
+        def run():
+            if self._load(key, loader).exception() is not None:
+                self.counters["refresh_errors"] += 1
+        self._pool.submit(run)
+
+    def get(self, key: str, loader: Callable[[], Any]) -> Tuple[Any, str]:
+        """Returns (value, "fresh" | "stale" | "miss")."""
+        state, value = self._lookup(key)
+        if state == "stale":
+            self._refresh_in_background(key, loader)
+        if state == "miss":
+            value = self._load(key, loader).result()
+        return copy.deepcopy(value), state
+
+    # ── async ─────────────────────────────────────────────────────────────────
+    async def _aload(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        # the load runs as its own task and every caller (the first included) awaits it
+        # through shield, so one cancelled caller doesn't cancel the load for the rest
+        loop = asyncio.get_running_loop()
+        akey = (id(loop), key)
+        task = self._ainflight.get(akey)
+        if task is None:
+            task = self._ainflight[akey] = loop.create_task(self._arun(akey, key, loader))
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())  # retrieved even if nobody waits
+        return await asyncio.shield(task)
+
+    async def _arun(self, akey: tuple, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await loader()
+            self._store(key, value)
+            return value
+        finally:
+            self._ainflight.pop(akey, None)
+
+    async def aget(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Tuple[Any, str]:
+        """Async twin of get(); background refresh runs as a task on the current loop."""
+        state, value = self._lookup(key)
+        if state == "stale" and (id(asyncio.get_running_loop()), key) not in self._ainflight:
+            self.counters["refreshes"] += 1
+            task = asyncio.create_task(self._aload(key, loader))
+            self._tasks.add(task)
+            def done(t: "asyncio.Task[Any]"):
+                self._tasks.discard(t)
+                if t.cancelled() or t.exception() is not None:
+                    self.counters["refresh_errors"] += 1
+            task.add_done_callback(done)
+        if state == "miss":
+            value = await self._aload(key, loader)
+        return copy.deepcopy(value), state
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            served = self.counters["fresh_hits"] + self.counters["stale_hits"]
+            lookups = served + self.counters["misses"]
+            return {
+                **self.counters,
+                "hit_rate": round(served / lookups, 3) if lookups else 0.0,
+                "entries": len(self._data),
+                "limits": {"soft_ttl_sec": self.soft_ttl_sec, "hard_ttl_sec": self.hard_ttl_sec,
+                           "max_entries": self.max_entries},
+            }
+
+def _sweep_loop():
+    while True:
+        time.sleep(CACHE_SWEEP_SEC)
+        with _registry_lock:
+            caches = [c for c in _registry.values() if isinstance(c, TieredCache)]
+        for c in caches:
+            try:
+                c.sweep()
+            except Exception:
+                pass
+
+def _ensure_sweeper():
+    global _sweeper
+    with _registry_lock:
+        if _sweeper is None and CACHE_SWEEP_SEC > 0:
+            _sweeper = threading.Thread(target=_sweep_loop, name="cache-sweeper", daemon=True)
+            _sweeper.start()
+
+def all_stats() -> Dict[str, Any]:
+    with _registry_lock:
+        caches = list(_registry.values())
+    return {c.name: c.stats() for c in caches}
@@ -0,0 +1,24 @@
+# api/config.py
+import os, json
+from typing import Dict, Any, Tuple
+
+PROFILE_PATH = "data/profile.json"
+COMMUTE_PATH = "data/commute.json"
+
+def load_profile_coords() -> Tuple[float, float]:
+    # fallback if file is missing
+    lat = float(os.getenv("DEFAULT_LAT", "33.424"))
+    lon = float(os.getenv("DEFAULT_LON", "-111.928"))
+    try:
+        with open(PROFILE_PATH, "r") as f:
+            prof = json.load(f)
+        # if you added lat/lon to profile, prefer those; else keep defaults
+        lat = float(prof.get("lat", lat))
+        lon = float(prof.get("lon", lon))
+    except Exception:
+        pass
+    return lat, lon
+
+def load_commute_cfg() -> Dict[str, Any]:
+    with open(COMMUTE_PATH, "r") as f:
+        return json.load(f)
@@ -0,0 +1,95 @@
+# api/geo.py
+"""Vectorized (NumPy) route geometry for the OTW corridor filter."""
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+EARTH_R_KM = 6371.0
+M_PER_DEG_LAT = 111_320.0
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Great-circle distance in km; accepts scalars or equally-shaped arrays."""
+    p1, p2 = np.radians(lat1), np.radians(lat2)
+    dphi = p2 - p1
+    dlmb = np.radians(np.asarray(lon2) - np.asarray(lon1))
+    a = np.sin(dphi / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(dlmb / 2) ** 2
+    return 2 * EARTH_R_KM * np.arcsin(np.sqrt(a))
+
+def sample_points(geojson_coords: List[List[float]], every_km: float = 2.0, max_points: int = 6) -> List[Tuple[float, float]]:
+    """Downsample route (lon,lat) pairs ~every_km; cap to max_points; always end on the last vertex. Returns (lat,lon)."""
+    if not geojson_coords:
+        return []
+    xy = np.asarray(geojson_coords, dtype=float)
+    lon, lat = xy[:, 0], xy[:, 1]
+    if len(xy) == 1:
+        return [(float(lat[0]), float(lon[0]))]
+    cum = np.concatenate([[0.0], np.cumsum(haversine_km(lat[:-1], lon[:-1], lat[1:], lon[1:]))])
+    # first vertex of each every_km bucket
+    bucket = np.floor(cum / every_km).astype(int)
+    idx = np.flatnonzero(np.diff(bucket, prepend=-1))[:max_points]
+    last = len(xy) - 1
+    if idx[-1] != last:
+        if len(idx) < max_points:
+            idx = np.append(idx, last)
+        else:
+            idx[-1] = last
+    return [(float(lat[i]), float(lon[i])) for i in idx]
+
+CORRIDOR_BLOCK_CELLS = 262_144  # points × segments per block, bounds peak memory (~10 MB)
+
+def _corridor_block(Pm: np.ndarray, A: np.ndarray, AB: np.ndarray, seg_len2: np.ndarray):
+    """Closest segment, distance and clamped t for one block of projected points."""
+    APy = Pm[:, 0, None] - A[None, :, 0]          # (n, M)
+    APx = Pm[:, 1, None] - A[None, :, 1]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = np.where(seg_len2 > 0, (APy * AB[:, 0] + APx * AB[:, 1]) / seg_len2, 0.0)
+    np.clip(t, 0.0, 1.0, out=t)
+    d2 = (APy - t * AB[:, 0]) ** 2 + (APx - t * AB[:, 1]) ** 2
+    best = d2.argmin(axis=1)
+    rows = np.arange(len(Pm))
+    return np.sqrt(d2[rows, best]), best, t[rows, best]
+
+def corridor(points: List[Tuple[float, float]], line: List[Tuple[float, float]],
+             max_dist_m: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    For every (lat,lon) point: perpendicular distance (m) to the (lat,lon) polyline
+    and position (m) along it of the closest projection. Points are processed in
+    blocks of CORRIDOR_BLOCK_CELLS; with max_dist_m, points outside the route's
+    bbox grown by that much are skipped and get inf distance (along 0).
+    Local equirectangular projection — fine at commute scale.
+    """
+    P = np.asarray(points, dtype=float).reshape(-1, 2)
+    L = np.asarray(line, dtype=float).reshape(-1, 2)
+    if len(P) == 0 or len(L) == 0:
+        return np.zeros(0), np.zeros(0)
+    if len(L) == 1:
+        L = np.vstack([L, L])
+
+    lat0 = np.radians(L[:, 0].mean())
+    scale = np.array([M_PER_DEG_LAT, M_PER_DEG_LAT * np.cos(lat0)])
+    Lm = L * scale                       # (M+1, 2) metres (y=lat, x=lon)
+    Pm = P * scale                       # (N, 2)
+
+    A, B = Lm[:-1], Lm[1:]               # segments (M, 2)
+    AB = B - A
+    seg_len2 = (AB ** 2).sum(axis=1)     # (M,)
+    seg_len = np.sqrt(seg_len2)
+    start_m = np.concatenate([[0.0], np.cumsum(seg_len)[:-1]])
+
+    dist = np.full(len(P), np.inf)
+    along = np.zeros(len(P))
+    idx = np.arange(len(P))
+    if max_dist_m is not None:
+        lo, hi = Lm.min(axis=0) - max_dist_m, Lm.max(axis=0) + max_dist_m
+        idx = idx[((Pm >= lo) & (Pm <= hi)).all(axis=1)]
+    step = max(1, CORRIDOR_BLOCK_CELLS // len(A))
+    for k in range(0, len(idx), step):
+        sel = idx[k:k + step]
+        d, best, t = _corridor_block(Pm[sel], A, AB, seg_len2)
+        dist[sel] = d
+        along[sel] = start_m[best] + t * seg_len[best]
+    return dist, along
+
+def estimate_detour_sec(dist_m: np.ndarray, speed_kmh: float = 30.0, road_factor: float = 1.4) -> np.ndarray:
+    """Rough out-and-back detour from the corridor distance, used to rank before any network call."""
+    return 2 * dist_m * road_factor / (speed_kmh / 3.6)
@@ -0,0 +1,228 @@
+# api/http_client.py
+"""
+Shared, pooled HTTP clients for every outbound call (Open-Meteo, Mapbox,
+Overpass, Rainforest, Ollama, our own API in brief http mode).
+
+- sync:  one requests.Session with keep-alive pools per host + retries
+- async: one httpx.AsyncClient per event loop (HTTP/2 when `h2` is installed)
+Both record per-host counters, see pool_stats().
+"""
+import os, time, asyncio, threading, importlib.util
+from typing import Dict, Any, Optional, Callable, TypeVar, AsyncIterator
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import httpx
+
+HTTP_TIMEOUT_SEC = float(os.getenv("HTTP_TIMEOUT_SEC", "15"))
+HTTP_POOL_HOSTS = int(os.getenv("HTTP_POOL_HOSTS", "16"))            # distinct hosts kept pooled
+HTTP_MAX_PER_HOST = int(os.getenv("HTTP_MAX_PER_HOST", "10"))        # connections per host
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))  # async, all hosts
+HTTP_KEEPALIVE_SEC = float(os.getenv("HTTP_KEEPALIVE_SEC", "30"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", "0.3"))
+HTTP_HTTP2 = os.getenv("HTTP_HTTP2", "true").lower() == "true" and importlib.util.find_spec("h2") is not None
+
+def _parse_limits(raw: str) -> Dict[str, int]:
+    # "127.0.0.1:11434=2,overpass-api.de=2" → {"127.0.0.1:11434": 2, ...}
+    out: Dict[str, int] = {}
+    for part in raw.split(","):
+        if "=" in part:
+            k, v = part.rsplit("=", 1)
+            out[k.strip()] = int(v)
+    return out
+
+# Async in-flight caps per upstream (host, or a named lane for thread-offloaded work).
+# Anything not listed gets HTTP_MAX_PER_HOST.
+UPSTREAM_LIMITS: Dict[str, int] = {
+    "127.0.0.1:11434": 2,    # local Ollama: one model, queueing more only adds latency
+    "overpass-api.de": 2,    # public Overpass rate limits aggressively
+    "places": 4,             # search_along_route pipeline (thread-offloaded)
+    "brief": 1,              # one Daily Brief composition at a time
+    "schedule_llm": 1,       # one chunked LLM schedule parse at a time (it fans out itself)
+}
+UPSTREAM_LIMITS.update(_parse_limits(os.getenv("HTTP_UPSTREAM_LIMITS", "")))
+
+_RETRY_STATUS = (429, 500, 502, 503, 504)
+_IDEMPOTENT = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+T = TypeVar("T")
+
+# ── Stats ─────────────────────────────────────────────────────────────────────
+_stats_lock = threading.Lock()
+_host_stats: Dict[str, Dict[str, Any]] = {}
+
+def _host(url: str) -> str:
+    return urlsplit(url).netloc or "?"
+
+def _record(host: str, elapsed_ms: float, status: Optional[int], flavor: str):
+    with _stats_lock:
+        s = _host_stats.setdefault(host, {"requests": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0,
+                                          "sync": 0, "async": 0, "http2": 0})
+        s["requests"] += 1
+        s[flavor] += 1
+        s["total_ms"] += elapsed_ms
+        s["max_ms"] = max(s["max_ms"], elapsed_ms)
+        if status is None or status >= 400:
+            s["errors"] += 1
+
+def _record_http2(host: str):
+    with _stats_lock:
+        if host in _host_stats:
+            _host_stats[host]["http2"] += 1
+
+# ── Sync (requests) ───────────────────────────────────────────────────────────
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+def _on_response(resp: requests.Response, *args, **kwargs):
+    _record(_host(resp.url), resp.elapsed.total_seconds() * 1000, resp.status_code, "sync")
+
+def session() -> requests.Session:
+    """Process-wide requests.Session; safe to share across the brief/agent threads."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                retry = Retry(total=HTTP_RETRIES, connect=HTTP_RETRIES, read=HTTP_RETRIES,
+                              status=HTTP_RETRIES, backoff_factor=HTTP_RETRY_BACKOFF,
+                              status_forcelist=_RETRY_STATUS, allowed_methods=frozenset(_IDEMPOTENT),
+                              raise_on_status=False)  # hand the last response back to the caller
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_MAX_PER_HOST,
+                                      pool_block=True, max_retries=retry)
+                s = requests.Session()
+                s.mount("https://", adapter)
+                s.mount("http://", adapter)
+                s.hooks["response"].append(_on_response)
+                _session = s
+    return _session
+
+def request(method: str, url: str, **kw) -> requests.Response:
+    kw.setdefault("timeout", HTTP_TIMEOUT_SEC)
+    try:
+        return session().request(method, url, **kw)
+    except requests.exceptions.RequestException:
+        _record(_host(url), 0.0, None, "sync")
+        raise
+
+def get(url: str, **kw) -> requests.Response:
+    return request("GET", url, **kw)
+
+def post(url: str, **kw) -> requests.Response:
+    return request("POST", url, **kw)
+
+# ── Async (httpx) ─────────────────────────────────────────────────────────────
+_aclients: Dict[int, httpx.AsyncClient] = {}
+_sems: Dict[tuple, asyncio.Semaphore] = {}
+
+def async_client() -> httpx.AsyncClient:
+    """httpx.AsyncClient bound to the running loop (clients can't hop loops)."""
+    loop_id = id(asyncio.get_running_loop())
+    c = _aclients.get(loop_id)
+    if c is None or c.is_closed:
+        c = httpx.AsyncClient(
+            http2=HTTP_HTTP2,
+            timeout=HTTP_TIMEOUT_SEC,
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                                max_keepalive_connections=HTTP_POOL_HOSTS * 2,
+                                keepalive_expiry=HTTP_KEEPALIVE_SEC),
+            transport=httpx.AsyncHTTPTransport(http2=HTTP_HTTP2, retries=HTTP_RETRIES),
+        )
+        _aclients[loop_id] = c
+    return c
+
+def limiter(upstream: str) -> asyncio.Semaphore:
+    """Per-loop semaphore capping in-flight async work against one upstream."""
+    # httpx only caps connections globally; this enforces the per-upstream limit
+    key = (id(asyncio.get_running_loop()), upstream)
+    sem = _sems.get(key)
+    if sem is None:
+        sem = _sems[key] = asyncio.Semaphore(UPSTREAM_LIMITS.get(upstream, HTTP_MAX_PER_HOST))
+    return sem
+
+async def run_limited(upstream: str, fn: Callable[..., T], *args, **kwargs) -> T:
+    """Run a blocking pipeline on a worker thread, bounded by the upstream's limit."""
+    async with limiter(upstream):
+        return await asyncio.to_thread(fn, *args, **kwargs)
+
+async def arequest(method: str, url: str, **kw) -> httpx.Response:
+    host = _host(url)
+    attempts = 1 + (HTTP_RETRIES if method.upper() in _IDEMPOTENT else 0)
+    for i in range(attempts):
+        t0 = time.perf_counter()
+        try:
+            async with limiter(host):
+                r = await async_client().request(method, url, **kw)
+        except httpx.HTTPError:
+            _record(host, (time.perf_counter() - t0) * 1000, None, "async")
+            if i + 1 >= attempts:
+                raise
+        else:
+            _record(host, (time.perf_counter() - t0) * 1000, r.status_code, "async")
+            if r.http_version == "HTTP/2":
+                _record_http2(host)
+            if r.status_code not in _RETRY_STATUS or i + 1 >= attempts:
+                return r
+        await asyncio.sleep(HTTP_RETRY_BACKOFF * (2 ** i))
+    raise RuntimeError("unreachable")
+
+async def astream_lines(method: str, url: str, **kw) -> AsyncIterator[str]:
+    """Yield a streamed response (NDJSON/SSE upstream) line by line. No retries once bytes flow."""
+    host = _host(url)
+    t0 = time.perf_counter()
+    status: Optional[int] = None
+    try:
+        async with limiter(host):
+            async with async_client().stream(method, url, **kw) as r:
+                status = r.status_code
+                r.raise_for_status()
+                async for line in r.aiter_lines():
+                    if line:
+                        yield line
+    except httpx.HTTPError:
+        status = None
+        raise
+    finally:
+        _record(host, (time.perf_counter() - t0) * 1000, status, "async")
+
+async def aget(url: str, **kw) -> httpx.Response:
+    return await arequest("GET", url, **kw)
+
+async def apost(url: str, **kw) -> httpx.Response:
+    return await arequest("POST", url, **kw)
+
+async def aclose():
+    """Close async clients (FastAPI shutdown)."""
+    for k, c in list(_aclients.items()):
+        await c.aclose()
+        _aclients.pop(k, None)
+
+# ── Monitoring ────────────────────────────────────────────────────────────────
+def pool_stats() -> Dict[str, Any]:
+    pools = []
+    if _session is not None:
+        pm = _session.get_adapter("https://").poolmanager
+        for key in list(pm.pools.keys()):
+            p = pm.pools.get(key)
+            if p is None:
+                continue
+            pools.append({
+                "host": f"{p.host}:{p.port}",
+                "scheme": p.scheme,
+                "opened": p.num_connections,
+                "requests": p.num_requests,
+                "idle": p.pool.qsize() if p.pool is not None else 0,
+            })
+    with _stats_lock:
+        hosts = {h: {**s, "avg_ms": round(s["total_ms"] / s["requests"], 1) if s["requests"] else 0.0,
+                     "total_ms": round(s["total_ms"], 1), "max_ms": round(s["max_ms"], 1)}
+                 for h, s in _host_stats.items()}
+    return {
+        "config": {"max_per_host": HTTP_MAX_PER_HOST, "upstream_limits": UPSTREAM_LIMITS, "max_connections": HTTP_MAX_CONNECTIONS,
+                   "retries": HTTP_RETRIES, "timeout_sec": HTTP_TIMEOUT_SEC, "http2": HTTP_HTTP2},
+        "sync_pools": pools,
+        "async_clients": sum(1 for c in _aclients.values() if not c.is_closed),
+        "hosts": hosts,
+    }
@@ -1,36 +1,162 @@
-import os, requests, json
+import os, requests, json, hashlib
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+from api import http_client, llm_backend
+from api.cache import TieredCache
 
 class LLMError(Exception): ...
 
-def llm_complete(system: str, user: str) -> str:
+OLLAMA_URL = f"{llm_backend.OLLAMA_BASE}/api/chat"
+
+# Content-addressed completion cache: identical prompt + model + options → same answer.
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+_CACHE = TieredCache("llm", os.getenv("LLM_CACHE_DIR", "data/.cache_llm"),
+                     float(os.getenv("LLM_CACHE_TTL_SEC", "86400")),
+                     max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2000")),
+                     max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", "20")) * 1024 * 1024))
+
+def _provider() -> str:
     prov = (os.getenv("LLM_PROVIDER") or "ollama").lower()
-    if prov == "ollama":
-        model = os.getenv("OLLAMA_MODEL", "llama3.1:8b")
+    if prov != "ollama":
+        raise LLMError(f"unsupported_provider:{prov}")
+    return prov
+
+def _ollama_body(system: str, user: str, options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {
+        "model": llm_backend.model(),
+        "messages": [
+            {"role": "system", "content": system},
+            {"role": "user", "content": user}
+        ],
+        "options": {"temperature": 0.2, "num_predict": 256, **(options or {})},
+        "stream": False,  # <-- IMPORTANT: disable streaming
+        "keep_alive": llm_backend.OLLAMA_KEEP_ALIVE,
+    }
+
+def _ollama_text(data: Any) -> str:
+    # Expected non-stream schema from Ollama:
+    # { "message": { "role":"assistant", "content":"..." }, ... }
+    if isinstance(data, dict) and "message" in data:
+        return (data["message"].get("content") or "").strip()
+    # Fallback: try to extract text-like fields
+    if isinstance(data, dict):
+        for k in ("content","text","response"):
+            if isinstance(data.get(k), str):
+                return data[k].strip()
+    raise LLMError(f"unexpected_response_schema: {data}")
+
+def _cache_key(prov: str, body: Dict[str, Any]) -> str:
+    raw = json.dumps({"provider": prov, "model": body["model"], "options": body["options"],
+                      "messages": body["messages"]}, sort_keys=True, ensure_ascii=False)
+    return "llm-" + hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+def _cached(key: str, bypass: bool) -> Optional[str]:
+    if not LLM_CACHE_ENABLED or bypass:
+        return None
+    hit = _CACHE.get(key)
+    return hit.get("text") if isinstance(hit, dict) else None
+
+def _remember(key: str, text: str, validate: Optional[Callable[[str], bool]] = None):
+    # only keep answers the caller can use, or a malformed one is replayed for the whole TTL
+    if not LLM_CACHE_ENABLED or not text:
+        return
+    try:
+        if validate is not None and not validate(text):
+            return
+    except Exception:
+        return
+    _CACHE.set(key, {"text": text})
+
+def llm_complete(system: str, user: str, options: Optional[Dict[str, Any]] = None,
+                 bypass_cache: bool = False, validate: Optional[Callable[[str], bool]] = None) -> str:
+    """
+    options override the Ollama defaults (e.g. {"num_predict": 1024}).
+    Answers are cached by hash of provider/model/options/prompt; bypass_cache=True
+    skips the lookup and stores the fresh answer. validate(text) → False (or
+    raising) keeps an answer out of the cache.
+    """
+    prov = _provider()
+    body = _ollama_body(system, user, options)
+    key = _cache_key(prov, body)
+    hit = _cached(key, bypass_cache)
+    if hit is not None:
+        return hit
+    try:
+        r = http_client.post(OLLAMA_URL, json=body, timeout=90)
+        r.raise_for_status()
+        data = r.json()
+        llm_backend.record(data)
+        text = _ollama_text(data)
+        _remember(key, text, validate)
+        return text
+    except requests.exceptions.JSONDecodeError as e:
+        raise LLMError(f"ollama_json_decode_error: {e}; raw={r.text[:300]!r}")
+    except LLMError:
+        raise
+    except Exception as e:
+        raise LLMError(f"ollama_error: {e}")
+
+async def allm_complete(system: str, user: str, options: Optional[Dict[str, Any]] = None,
+                        bypass_cache: bool = False, validate: Optional[Callable[[str], bool]] = None) -> str:
+    """Async twin of llm_complete; the request is parked on the event loop, not a thread."""
+    prov = _provider()
+    body = _ollama_body(system, user, options)
+    key = _cache_key(prov, body)
+    hit = _cached(key, bypass_cache)
+    if hit is not None:
+        return hit
+    try:
+        r = await http_client.apost(OLLAMA_URL, json=body, timeout=90)
+        r.raise_for_status()
         try:
-            r = requests.post("http://127.0.0.1:11434/api/chat", json={
-                "model": model,
-                "messages": [
-                    {"role": "system", "content": system},
-                    {"role": "user", "content": user}
-                ],
-                "options": {"temperature": 0.2, "num_predict": 256},
-                "stream": False  # <-- IMPORTANT: disable streaming
-            }, timeout=90)
-            r.raise_for_status()
             data = r.json()
-            # Expected non-stream schema from Ollama:
-            # { "message": { "role":"assistant", "content":"..." }, ... }
-            if isinstance(data, dict) and "message" in data:
-                return (data["message"].get("content") or "").strip()
-            # Fallback: try to extract text-like fields
-            if isinstance(data, dict):
-                for k in ("content","text","response"):
-                    if isinstance(data.get(k), str):
-                        return data[k].strip()
-            raise LLMError(f"unexpected_response_schema: {data}")
-        except requests.exceptions.JSONDecodeError as e:
+        except json.JSONDecodeError as e:
             raise LLMError(f"ollama_json_decode_error: {e}; raw={r.text[:300]!r}")
-        except Exception as e:
-            raise LLMError(f"ollama_error: {e}")
-    else:
-        raise LLMError(f"unsupported_provider:{prov}")
\ No newline at end of file
+        llm_backend.record(data)
+        text = _ollama_text(data)
+        _remember(key, text, validate)
+        return text
+    except LLMError:
+        raise
+    except Exception as e:
+        raise LLMError(f"ollama_error: {e}")
+
+async def allm_stream(system: str, user: str, options: Optional[Dict[str, Any]] = None,
+                      bypass_cache: bool = False,
+                      validate: Optional[Callable[[str], bool]] = None) -> AsyncIterator[str]:
+    """
+    Yield content deltas as Ollama generates them (stream=true, NDJSON chunks).
+    Shares the completion cache with llm_complete: a hit is yielded as one delta,
+    and a finished stream stores the full answer.
+    """
+    prov = _provider()
+    body = _ollama_body(system, user, options)
+    key = _cache_key(prov, body)
+    hit = _cached(key, bypass_cache)
+    if hit is not None:
+        yield hit
+        return
+    parts = []
+    try:
+        async with aclosing(http_client.astream_lines("POST", OLLAMA_URL, json={**body, "stream": True},
+                                                      timeout=90)) as lines:
+            async for line in lines:
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise LLMError(f"ollama_json_decode_error: {e}; raw={line[:300]!r}")
+                if data.get("error"):
+                    raise LLMError(f"ollama_error: {data['error']}")
+                delta = (data.get("message") or {}).get("content") or ""
+                if delta:
+                    parts.append(delta)
+                    yield delta
+                if data.get("done"):
+                    llm_backend.record(data)
+                    break
+    except LLMError:
+        raise
+    except Exception as e:
+        raise LLMError(f"ollama_error: {e}")
+    _remember(key, "".join(parts).strip(), validate)
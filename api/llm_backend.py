@@ -0,0 +1,94 @@
+# api/llm_backend.py
+"""
+Keeps the local Ollama model resident so the first call of the day doesn't pay
+the model load.
+
+- every request carries keep_alive (OLLAMA_KEEP_ALIVE) so the model stays loaded
+- warmup() loads the model with an empty generate call; main.py runs it at
+  startup and LLM_WARMUP_LEAD_MIN before the scheduled brief
+- record() keeps the load/eval durations Ollama reports, see stats()
+"""
+import os, time, threading
+from typing import Any, Dict, Optional
+
+from api import http_client
+
+OLLAMA_BASE = os.getenv("OLLAMA_BASE", "http://127.0.0.1:11434")
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+LLM_WARMUP_ON_STARTUP = os.getenv("LLM_WARMUP_ON_STARTUP", "true").lower() == "true"
+LLM_WARMUP_LEAD_MIN = int(os.getenv("LLM_WARMUP_LEAD_MIN", "10"))
+COLD_LOAD_MS = 1000.0  # a load_duration above this means the model wasn't resident
+
+_lock = threading.Lock()
+_stats: Dict[str, Any] = {
+    "calls": 0, "cold_loads": 0,
+    "load_ms_total": 0.0, "eval_ms_total": 0.0, "prompt_eval_ms_total": 0.0, "eval_tokens": 0,
+    "warmups": 0, "warmup_failures": 0, "last_warmup_at": None, "last_warmup_error": None,
+    "last": None,
+}
+
+def model() -> str:
+    return os.getenv("OLLAMA_MODEL", "llama3.1:8b")
+
+def _ms(ns: Any) -> float:
+    try:
+        return float(ns) / 1e6
+    except (TypeError, ValueError):
+        return 0.0
+
+def record(data: Any):
+    """Feed a final Ollama response (non-stream body or the done chunk of a stream)."""
+    if not isinstance(data, dict) or "total_duration" not in data:
+        return
+    load_ms, eval_ms = _ms(data.get("load_duration")), _ms(data.get("eval_duration"))
+    prompt_ms, tokens = _ms(data.get("prompt_eval_duration")), int(data.get("eval_count") or 0)
+    with _lock:
+        _stats["calls"] += 1
+        _stats["cold_loads"] += load_ms > COLD_LOAD_MS
+        _stats["load_ms_total"] += load_ms
+        _stats["eval_ms_total"] += eval_ms
+        _stats["prompt_eval_ms_total"] += prompt_ms
+        _stats["eval_tokens"] += tokens
+        _stats["last"] = {"load_ms": round(load_ms, 1), "prompt_eval_ms": round(prompt_ms, 1),
+                          "eval_ms": round(eval_ms, 1), "total_ms": round(_ms(data.get("total_duration")), 1),
+                          "eval_tokens": tokens, "at": time.time()}
+
+def warmup(timeout: float = 120) -> Dict[str, Any]:
+    """Load the model (no prompt → Ollama only loads it) and pin it for OLLAMA_KEEP_ALIVE."""
+    t0 = time.perf_counter()
+    try:
+        r = http_client.post(f"{OLLAMA_BASE}/api/generate",
+                             json={"model": model(), "keep_alive": OLLAMA_KEEP_ALIVE}, timeout=timeout)
+        r.raise_for_status()
+        data = r.json()
+    except Exception as e:
+        with _lock:
+            _stats["warmup_failures"] += 1
+            _stats["last_warmup_error"] = str(e)[:300]
+        return {"ok": False, "error": str(e)}
+    load_ms = _ms(data.get("load_duration"))
+    with _lock:
+        _stats["warmups"] += 1
+        _stats["last_warmup_at"] = time.time()
+        _stats["last_warmup_error"] = None
+    return {"ok": True, "model": model(), "load_ms": round(load_ms, 1),
+            "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1)}
+
+def warmup_time(brief_hhmm: str) -> Optional[tuple]:
+    """(hour, minute) LLM_WARMUP_LEAD_MIN before brief_hhmm, wrapping past midnight."""
+    try:
+        h, m = (int(x) for x in brief_hhmm.split(":"))
+    except Exception:
+        return None
+    t = (h * 60 + m - LLM_WARMUP_LEAD_MIN) % (24 * 60)
+    return t // 60, t % 60
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        s = dict(_stats)
+    n = s["calls"]
+    s["avg_load_ms"] = round(s["load_ms_total"] / n, 1) if n else 0.0
+    s["avg_eval_ms"] = round(s["eval_ms_total"] / n, 1) if n else 0.0
+    s["tokens_per_sec"] = round(s["eval_tokens"] / (s["eval_ms_total"] / 1000), 1) if s["eval_ms_total"] else 0.0
+    s["config"] = {"model": model(), "keep_alive": OLLAMA_KEEP_ALIVE, "warmup_lead_min": LLM_WARMUP_LEAD_MIN}
+    return s
@@ -1,26 +1,31 @@
-import os, json
+import os, io, json, asyncio, logging, tempfile, threading
 import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException, Body, UploadFile, File, Form, Query
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 
-from api.tools_weather import get_weather
-from api.tools_commute import get_commute, CommuteError
-from api.tools_calendar import connect as cal_connect, get_events_today_and_tomorrow, add_reminder, add_event
+from api.tools_weather import aget_weather
+from api.tools_commute import aget_commute, CommuteError
+from api.tools_calendar import connect as cal_connect, add_reminder, client_stats as cal_client_stats
+from api.tools_calendar import iter_add_events_batch, add_events_batch, upsert_reminder, get_events
 
 # ★ Use only the OSM implementation (avoid name clash on PlacesError)
-from api.tools_places_osm import search_along_route as osm_search_along_route, PlacesError
+from api.tools_places_osm import asearch_along_route as osm_search_along_route, PlacesError
+from api import poi_index
 
-from api.agent import plan_event, decide_actions, find_products, find_otw
+from api.agent import aplan_event, aplan_event_stream, aact
+from api.config import load_profile_coords as _load_profile_coords, load_commute_cfg as _load_commute_cfg
 
 # ★ CSV/rule parser + LLM parser come from different modules
-from api.schedule_parser import parse_schedule, extract_text
+from api.schedule_parser import parse_schedule, extract_text, iter_csv_events
 from api.schedule_llm import llm_parse_schedule
 
-from api.brief import compose_and_optionally_commit
+from api.brief import compose_and_optionally_commit, prefetch as brief_prefetch, BRIEF_PREFETCH_MIN
+from api import http_client, cache, plan_rules, llm_backend, users
 from apscheduler.schedulers.background import BackgroundScheduler
 
 load_dotenv()
@@ -33,17 +38,43 @@ app = FastAPI(title="Life Copilot API")
 def health():
     return JSONResponse({"ok": True})
 
-def _reschedule_brief(hhmm: str, enabled: bool):
+@app.get("/metrics")
+def metrics():
+    """Runtime counters for monitoring (HTTP pools, ...)."""
+    return JSONResponse({
+        "http": http_client.pool_stats(),
+        "cache": cache.all_stats(),
+        "poi_index": poi_index.stats(),
+        "calendar": cal_client_stats(),
+        "plan_rules": plan_rules.stats(),
+        "llm_backend": llm_backend.stats(),
+    })
+
+@app.on_event("shutdown")
+async def _close_http_clients():
+    await http_client.aclose()
+
+def _get_scheduler() -> BackgroundScheduler:
     global _scheduler
-    if not BRIEF_ENABLED:
-        return
     if _scheduler is None:
         _scheduler = BackgroundScheduler()
         _scheduler.start(paused=False)
+    return _scheduler
 
-    # clear existing jobs
-    for job in list(_scheduler.get_jobs()):
-        _scheduler.remove_job(job.id)
+def _first_stage(h: int, m: int) -> tuple:
+    """(hour, minute) the brief pipeline starts: the prefetch, or the brief itself."""
+    t = (h * 60 + m - max(0, BRIEF_PREFETCH_MIN)) % (24 * 60)
+    return t // 60, t % 60
+
+def _reschedule_brief(hhmm: str, enabled: bool):
+    if not BRIEF_ENABLED:
+        return
+    _get_scheduler()
+
+    # clear the existing brief jobs (other jobs, e.g. POI refresh, stay)
+    for job_id in ("daily_brief", "brief_prefetch", "llm_warmup"):
+        if _scheduler.get_job(job_id):
+            _scheduler.remove_job(job_id)
 
     if not enabled:
         return
@@ -64,6 +95,61 @@ def _reschedule_brief(hhmm: str, enabled: bool):
         replace_existing=True
     )
 
+    # slow stages (inputs, plan, act) run early; the brief job then only refreshes the commute
+    ph, pm = _first_stage(H, M)
+    if BRIEF_PREFETCH_MIN > 0:
+        _scheduler.add_job(
+            func=lambda: brief_prefetch(),
+            trigger="cron",
+            hour=ph, minute=pm, second=0,
+            id="brief_prefetch",
+            replace_existing=True
+        )
+
+    # load the model ahead of the first stage so its LLM calls don't pay the cold start
+    wh, wm = llm_backend.warmup_time(f"{ph:02d}:{pm:02d}")
+    _scheduler.add_job(
+        func=llm_backend.warmup,
+        trigger="cron",
+        hour=wh, minute=wm, second=0,
+        id="llm_warmup",
+        replace_existing=True
+    )
+
+@app.on_event("startup")
+def _startup_llm_warmup():
+    if not llm_backend.LLM_WARMUP_ON_STARTUP:
+        return
+    # one-off job so startup doesn't block on the model load
+    _get_scheduler().add_job(func=llm_backend.warmup, id="llm_warmup_startup",
+                             next_run_time=dt.datetime.now(), replace_existing=True)
+
+@app.post("/llm/warmup")
+def llm_warmup():
+    """Load OLLAMA_MODEL now and pin it for OLLAMA_KEEP_ALIVE. Returns {ok, model, load_ms, elapsed_ms}."""
+    out = llm_backend.warmup()
+    if not out.get("ok"):
+        raise HTTPException(status_code=503, detail=f"llm_warmup_failed: {out.get('error')}")
+    return JSONResponse(out)
+
+# periodic POI import for offline OTW lookups (only when POI_BBOX is configured)
+@app.on_event("startup")
+def _startup_poi_refresh():
+    bbox = poi_index.parse_bbox(poi_index.POI_BBOX)
+    if not bbox:
+        return
+    opts = {}
+    if not poi_index.fresh(bbox):
+        opts["next_run_time"] = dt.datetime.now()  # import right away, then on the interval
+    _get_scheduler().add_job(
+        func=lambda: poi_index.import_bbox(bbox),
+        trigger="interval",
+        days=max(1, int(poi_index.POI_MAX_AGE_DAYS // 2)),
+        id="poi_refresh",
+        replace_existing=True,
+        **opts
+    )
+
 # kick scheduler on startup with defaults or persisted config
 @app.on_event("startup")
 def _startup_schedule():
@@ -83,24 +169,177 @@ def _startup_schedule():
     except Exception:
         pass
 
-def _load_profile_coords():
-    # fallback if file is missing
-    lat = float(os.getenv("DEFAULT_LAT", "33.424"))
-    lon = float(os.getenv("DEFAULT_LON", "-111.928"))
+# ── Per-user briefs ───────────────────────────────────────────────────────────
+# One cron job per user at their brief time, offset by a stable 0–59 s so a crowd
+# of 07:00 users doesn't fire at once. Jobs only enqueue; BRIEF_WORKERS bounds how
+# many briefs compose at a time. Users on the same weather cell / route share the
+# upstream fetch through the weather/commute SWR caches (single-flight per key).
+BRIEF_WORKERS = int(os.getenv("BRIEF_WORKERS", "4"))
+_brief_pool = ThreadPoolExecutor(max_workers=BRIEF_WORKERS, thread_name_prefix="brief-user")
+_brief_running: set = set()
+_brief_running_lock = threading.Lock()
+_log = logging.getLogger("life_copilot.brief")
+
+def _compose_user_brief(user_id: str, create_leave_event: bool = True, force: bool = False) -> dict:
+    with _brief_running_lock:
+        if user_id in _brief_running:
+            return {"user_id": user_id, "skipped": "already_running"}
+        _brief_running.add(user_id)
     try:
-        with open("data/profile.json", "r") as f:
-            prof = json.load(f)
-        # if you added lat/lon to profile, prefer those; else keep defaults
-        lat = float(prof.get("lat", lat))
-        lon = float(prof.get("lon", lon))
-    except Exception:
-        pass
-    return lat, lon
+        u = users.get_user(user_id)  # re-read: the config may have changed since scheduling
+        if not u:
+            return {"user_id": user_id, "skipped": "unknown_user"}
+        return compose_and_optionally_commit(create_leave_event=create_leave_event, user=u, force=force)
+    finally:
+        with _brief_running_lock:
+            _brief_running.discard(user_id)
+
+def _enqueue_user_brief(user_id: str):
+    def run():
+        try:
+            _compose_user_brief(user_id)
+        except Exception:
+            _log.exception("brief failed for user %s", user_id)
+    _brief_pool.submit(run)
+
+def _enqueue_user_prefetch(user_id: str):
+    def run():
+        u = users.get_user(user_id)
+        if not u:
+            return
+        try:
+            brief_prefetch(u)
+        except Exception:
+            _log.exception("brief prefetch failed for user %s", user_id)
+    _brief_pool.submit(run)
+
+def _parse_hhmm(hhmm: str):
+    import re
+    m = re.match(r"^(\d{2}):(\d{2})$", hhmm or "")
+    return (int(m.group(1)), int(m.group(2))) if m else None
+
+def _schedule_user_brief(u: dict):
+    sched = _get_scheduler()
+    uid = u["user_id"]
+    job_id = f"brief:{uid}"
+    for jid in (job_id, f"prefetch:{uid}"):
+        if sched.get_job(jid):
+            sched.remove_job(jid)
+    b = u.get("brief") or {}
+    hm = _parse_hhmm(b.get("time") or BRIEF_TIME)
+    if not BRIEF_ENABLED or not b.get("enabled", True) or not hm:
+        return
+    sched.add_job(
+        func=_enqueue_user_brief, args=[uid],
+        trigger="cron",
+        hour=hm[0], minute=hm[1], second=users.brief_offset_sec(uid),
+        timezone=ZoneInfo(u.get("tz") or TZ),
+        id=job_id, replace_existing=True,
+        coalesce=True, misfire_grace_time=300,
+    )
+    if BRIEF_PREFETCH_MIN > 0:
+        ph, pm = _first_stage(*hm)
+        sched.add_job(
+            func=_enqueue_user_prefetch, args=[uid],
+            trigger="cron",
+            hour=ph, minute=pm, second=users.brief_offset_sec(uid),
+            timezone=ZoneInfo(u.get("tz") or TZ),
+            id=f"prefetch:{uid}", replace_existing=True,
+            coalesce=True, misfire_grace_time=300,
+        )
+
+def _sync_user_warmups():
+    """One LLM warmup job per distinct (first stage time, tz) among enabled users."""
+    sched = _get_scheduler()
+    for job in sched.get_jobs():
+        if job.id.startswith("llm_warmup:"):
+            sched.remove_job(job.id)
+    slots = set()
+    for u in users.list_users():
+        b = u.get("brief") or {}
+        hm = _parse_hhmm(b.get("time") or BRIEF_TIME)
+        if b.get("enabled", True) and hm:
+            ph, pm = _first_stage(*hm)
+            slots.add((f"{ph:02d}:{pm:02d}", u.get("tz") or TZ))
+    for hhmm, tz in slots:
+        wh, wm = llm_backend.warmup_time(hhmm)
+        sched.add_job(func=llm_backend.warmup, trigger="cron", hour=wh, minute=wm, second=0,
+                      timezone=ZoneInfo(tz), id=f"llm_warmup:{hhmm}:{tz}", replace_existing=True)
+
+@app.on_event("startup")
+def _startup_user_briefs():
+    if not BRIEF_ENABLED:
+        return
+    for u in users.list_users():
+        try:
+            _schedule_user_brief(u)
+        except Exception:
+            _log.exception("could not schedule brief for user %s", u.get("user_id"))
+    _sync_user_warmups()
+
+@app.get("/users")
+def users_list():
+    out = []
+    for u in users.list_users():
+        job = _scheduler.get_job(f"brief:{u['user_id']}") if _scheduler else None
+        out.append({**u, "next_brief": job.next_run_time.isoformat() if job and job.next_run_time else None})
+    return JSONResponse({"users": out})
+
+@app.put("/users/{user_id}")
+def users_put(user_id: str, payload: dict = Body(...)):
+    """
+    payload: {"tz", "profile": {lat, lon, ...}, "commute": {home, office, arrive_by, buffer_minutes},
+              "brief": {"time": "HH:MM", "enabled": true}}  (sections are merged)
+    """
+    try:
+        u = users.save_user(user_id, payload)
+        _schedule_user_brief(u)
+        _sync_user_warmups()
+        return JSONResponse({"ok": True, "user": u})
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"user_save_failed: {e}")
+
+@app.delete("/users/{user_id}")
+def users_delete(user_id: str):
+    try:
+        removed = users.delete_user(user_id)
+        for jid in (f"brief:{user_id}", f"prefetch:{user_id}"):
+            if _scheduler and _scheduler.get_job(jid):
+                _scheduler.remove_job(jid)
+        _sync_user_warmups()
+        return JSONResponse({"ok": removed})
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"user_delete_failed: {e}")
+
+@app.post("/users/{user_id}/calendar/connect")
+def users_calendar_connect(user_id: str):
+    """Run the Google consent flow for this user (stores the token next to their config)."""
+    try:
+        return JSONResponse(cal_connect(token_path=users.token_path(user_id)))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"calendar_connect_failed: {e}")
+
+@app.post("/users/{user_id}/brief/run")
+async def users_brief_run(user_id: str, payload: dict = Body(None)):
+    """Run one user's brief now, on the same bounded pool as the scheduled ones."""
+    if not BRIEF_ENABLED:
+        raise HTTPException(status_code=503, detail="brief_disabled")
+    if not users.get_user(user_id):
+        raise HTTPException(status_code=404, detail=f"unknown_user: {user_id}")
+    flag = bool((payload or {}).get("create_leave_event", True))
+    force = bool((payload or {}).get("force"))
+    try:
+        out = await asyncio.wrap_future(_brief_pool.submit(_compose_user_brief, user_id, flag, force))
+        return JSONResponse(out)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"brief_run_failed: {e}")
+
 @app.post("/brief/run")
-def brief_run(payload: dict = Body(None)):
+async def brief_run(payload: dict = Body(None)):
     """
-    Run the Daily Brief now. payload: {"create_leave_event": true/false}
-    Returns: {report_path, report_md, created_leave, plan, act, inputs}
+    Run the Daily Brief now. payload: {"create_leave_event": true/false, "force": false}
+    Stages whose inputs didn't change since the last run are reused; force=true recomputes all.
+    Returns: {report_path, report_md, created_leave, plan, act, inputs, mode, stages, timings_ms}
     """
     if not BRIEF_ENABLED:
         raise HTTPException(status_code=503, detail="brief_disabled")
@@ -108,7 +347,9 @@ def brief_run(payload: dict = Body(None)):
         flag = True
         if payload and "create_leave_event" in payload:
             flag = bool(payload["create_leave_event"])
-        out = compose_and_optionally_commit(create_leave_event=flag)
+        # the brief fans out on its own thread pool; keep it off the event loop
+        out = await http_client.run_limited("brief", compose_and_optionally_commit, create_leave_event=flag,
+                                            force=bool((payload or {}).get("force")))
         return JSONResponse(out)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"brief_run_failed: {e}")
@@ -144,10 +385,10 @@ def brief_config(payload: dict = Body(...)):
         raise HTTPException(status_code=400, detail=f"brief_config_failed: {e}")
 
 @app.get("/weather")
-def weather():
+async def weather():
     try:
         lat, lon = _load_profile_coords()
-        payload, latency_ms = get_weather(lat, lon, use_fahrenheit=True)
+        payload, latency_ms = await aget_weather(lat, lon, use_fahrenheit=True)
         payload["latency_ms"] = latency_ms
         return JSONResponse(payload)
     except Exception as e:
@@ -157,17 +398,11 @@ def weather():
 
 import json
 from fastapi import HTTPException
-from api.tools_commute import get_commute, CommuteError
-
-def _load_commute_cfg():
-    with open("data/commute.json", "r") as f:
-        return json.load(f)
-
 @app.get("/commute")
-def commute():
+async def commute():
     try:
         cfg = _load_commute_cfg()
-        payload, latency_ms = get_commute(
+        payload, latency_ms = await aget_commute(
             home=cfg["home"],
             office=cfg["office"],
             arrive_by_hhmm=cfg["arrive_by"],
@@ -182,7 +417,7 @@ def commute():
     
 
     from fastapi import Body
-from api.tools_calendar import connect as cal_connect, get_events_today_and_tomorrow, add_reminder
+from api.tools_calendar import connect as cal_connect, add_reminder
 
 @app.get("/calendar/connect")
 def calendar_connect():
@@ -193,9 +428,9 @@ def calendar_connect():
         raise HTTPException(status_code=400, detail=f"calendar_connect_failed: {e}")
 
 @app.get("/calendar/events")
-def calendar_events():
+def calendar_events(days: int = Query(2, ge=1, description="days from today, up to CALENDAR_WINDOW_DAYS")):
     try:
-        items = get_events_today_and_tomorrow("America/Phoenix")
+        items = get_events(days, "America/Phoenix")
         return JSONResponse({"events": items})
     except Exception as e:
         raise HTTPException(status_code=503, detail=f"calendar_events_failed: {e}")
@@ -207,7 +442,9 @@ def calendar_reminder(payload: dict = Body(...)):
       "summary": "Leave by 08:27",
       "when": "2025-09-12T08:27",
       "description": "Commute buffer included",
-      "minutes": 0
+      "minutes": 0,
+      "event_id": "lcleave20250912...",  # optional: create-or-update under this id
+      "exists": false                    # optional: id already written → update first
     }
     """
     try:
@@ -215,7 +452,11 @@ def calendar_reminder(payload: dict = Body(...)):
         when_iso = payload["when"]
         description = payload.get("description")
         minutes = int(payload.get("minutes", 0))
-        created = add_reminder(summary, when_iso, description, minutes, tz_str="America/Phoenix")
+        if payload.get("event_id"):
+            created = upsert_reminder(payload["event_id"], summary, when_iso, description, minutes,
+                                      tz_str="America/Phoenix", exists=bool(payload.get("exists")))
+        else:
+            created = add_reminder(summary, when_iso, description, minutes, tz_str="America/Phoenix")
         return JSONResponse({"created": created})
     except KeyError as ke:
         raise HTTPException(status_code=400, detail=f"missing_field: {ke}")
@@ -223,11 +464,11 @@ def calendar_reminder(payload: dict = Body(...)):
         raise HTTPException(status_code=503, detail=f"calendar_reminder_failed: {e}")
     
 from fastapi import Query
-from api.tools_catalog import search_products, CatalogError
+from api.tools_catalog import asearch_products, CatalogError
 from api.scoring import score_products
 
 @app.get("/catalog/search")
-def catalog_search(
+async def catalog_search(
     q: str = Query(..., description="Product search query"),
     budget: float | None = Query(None),
     deadline: str | None = Query(None, description="YYYY-MM-DD latest acceptable delivery date"),
@@ -235,7 +476,7 @@ def catalog_search(
     zip: str | None = Query(None)
 ):
     try:
-        raw = search_products(q, budget=budget, deadline_iso=deadline,
+        raw = await asearch_products(q, budget=budget, deadline_iso=deadline,
                               prime_only=prime_only, provider="rainforest", zip_code=zip)
         if not raw:
             return JSONResponse({"items": [], "count": 0, "note": "no_results_after_filters"})
@@ -318,36 +559,77 @@ def catalog_order_reminder(payload: dict = Body(...)):
         raise HTTPException(status_code=400, detail=f"order_reminder_failed: {e}")
     
 @app.get("/places/along_route")
-def places_along_route(category: str):
+async def places_along_route(category: str):
     """
     Example: /places/along_route?category=coffee
     Free stack: OSM Overpass for POIs, Mapbox for detour.
     """
     try:
         cfg = _load_commute_cfg()
-        items = osm_search_along_route(category, cfg["home"], cfg["office"])
+        items = await osm_search_along_route(category, cfg["home"], cfg["office"])
         return JSONResponse({"items": items})
     except PlacesError as pe:
         raise HTTPException(status_code=400, detail=str(pe))
     except Exception as e:
         raise HTTPException(status_code=503, detail=f"places_unavailable: {e}")
     
+@app.post("/places/index/import")
+def places_index_import(payload: dict = Body(None)):
+    """
+    Bulk-import OSM POIs into the local index.
+    payload: {"bbox": "south,west,north,east", "categories": ["coffee", ...]}  (bbox defaults to POI_BBOX)
+    """
+    payload = payload or {}
+    bbox = poi_index.parse_bbox(payload.get("bbox") or poi_index.POI_BBOX)
+    if not bbox:
+        raise HTTPException(status_code=400, detail="missing_bbox")
+    try:
+        counts = poi_index.import_bbox(bbox, payload.get("categories"))
+        return JSONResponse({"imported": counts, "bbox": list(bbox)})
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"poi_import_failed: {e}")
+
 @app.post("/agent/plan")
-def agent_plan(payload: dict):
+async def agent_plan(payload: dict):
     """
-    payload: { "events": [...], "weather_brief": "string" }
+    payload: { "events": [...], "weather_brief": "string", "fresh": false }
     events format: each item at least has summary; if available include start (ISO) and location.
+    fresh=true skips the LLM completion cache and regenerates the plan.
     """
     try:
         events = payload.get("events", [])
         weather = payload.get("weather_brief", "")
-        plan = plan_event(events, weather)
+        plan = await aplan_event(events, weather, fresh=bool(payload.get("fresh")))
         return JSONResponse({"plan": plan})
     except Exception as e:
         raise HTTPException(status_code=503, detail=f"agent_plan_failed: {e}")
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/agent/plan/stream")
+async def agent_plan_stream(payload: dict):
+    """
+    Same payload as /agent/plan, answered as Server-Sent Events:
+      event: field  data: {"field":"scenario","value":...} | {"field":"checklist","item":...}
+      event: plan   data: {"plan": {...}}   (final, same shape as /agent/plan)
+      event: error  data: {"detail": "..."}
+    """
+    events = payload.get("events", [])
+    weather = payload.get("weather_brief", "")
+
+    async def gen():
+        try:
+            async for kind, data in aplan_event_stream(events, weather, fresh=bool(payload.get("fresh"))):
+                yield _sse(kind, data if kind == "field" else {"plan": data})
+        except Exception as e:
+            yield _sse("error", {"detail": f"agent_plan_failed: {e}"})
+
+    return StreamingResponse(gen(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.post("/agent/act")
-def agent_act(payload: dict):
+async def agent_act(payload: dict):
     """
     payload: {
       "plan": {...},            # from /agent/plan
@@ -359,55 +641,82 @@ def agent_act(payload: dict):
         cfg = _load_commute_cfg()  # you already have this from earlier phases
         plan = payload.get("plan", {})
         answers = payload.get("answers", {})
-        actions = decide_actions(plan, answers)
-
-        recs = find_products(actions.get("catalog_queries", []))
-        otw = find_otw(actions.get("need_otw_categories", []) if payload.get("use_otw") else [], cfg["home"], cfg["office"])
-
-        return JSONResponse({
-            "scenario": plan.get("scenario"),
-            "event_title": plan.get("event_title"),
-            "event_time": plan.get("event_time"),
-            "venue": plan.get("venue"),
-            "checklist": plan.get("checklist", []),
-            "questions": plan.get("questions", []),
-            "recommendations": recs,
-            "otw": otw,
-            "actions": actions
-        })
+        out = await aact(plan, answers, bool(payload.get("use_otw")), cfg["home"], cfg["office"])
+        return JSONResponse(out)
     except Exception as e:
         raise HTTPException(status_code=503, detail=f"agent_act_failed: {e}")
     
+INGEST_SPOOL_MAX_BYTES = int(os.getenv("INGEST_SPOOL_MAX_BYTES", str(1024 * 1024)))
+INGEST_CHUNK_BYTES = 64 * 1024
+
+def _ingest_ndjson(spool, is_csv: bool, recurring: bool):
+    """Parse the spooled CSV row by row, yielding one NDJSON line per proposed event."""
+    text = io.TextIOWrapper(spool, encoding="utf-8", errors="ignore", newline="")
+    n = 0
+    try:
+        # Only CSVs are parsed in rule mode (same as parse_schedule); others yield nothing.
+        for ev in (iter_csv_events(text, recurring=recurring, tz=TZ) if is_csv else ()):
+            yield json.dumps({"type": "event", "index": n, "event": ev}) + "\n"
+            n += 1
+        yield json.dumps({"type": "done", "count": n, "used": "rule"}) + "\n"
+    except Exception as e:
+        yield json.dumps({"type": "error", "detail": f"schedule_ingest_failed: {e}", "count": n}) + "\n"
+    finally:
+        text.close()
+
 @app.post("/schedule/ingest")
 async def schedule_ingest(
     file: UploadFile = File(...),
     default_year: int = Form(None),
-    use_llm: bool | str = Form(False)   # accept str "true"/"false" from forms too
+    use_llm: bool | str = Form(False),  # accept str "true"/"false" from forms too
+    recurring: bool | str = Form(False),
+    stream: bool | str = Form(False)
 ):
     """
     Upload schedule (csv/txt/ics/pdf/png/jpg). If use_llm=true, parse with LLM.
     Returns proposed events plus any 'assumptions'. If LLM fails, falls back to rule parser.
+    recurring=true (rule parser): one event per class row with a weekly RRULE instead of
+    one event per meeting; /schedule/commit creates it as a single recurring event.
+    stream=true (rule parser, CSV): NDJSON, one {"type":"event"} line per event as rows
+    are parsed, then {"type":"done","count":n}; memory stays flat regardless of file size.
     """
     try:
         # normalize bool from form strings
         if isinstance(use_llm, str):
             use_llm = use_llm.strip().lower() in ("1", "true", "yes", "y", "on")
+        if isinstance(recurring, str):
+            recurring = recurring.strip().lower() in ("1", "true", "yes", "y", "on")
+        if isinstance(stream, str):
+            stream = stream.strip().lower() in ("1", "true", "yes", "y", "on")
+
+        if stream and not use_llm:
+            # UploadFile is closed once the handler returns, so spool it into our own
+            # file (RAM up to INGEST_SPOOL_MAX_BYTES, then disk) for the response to read.
+            spool = tempfile.SpooledTemporaryFile(max_size=INGEST_SPOOL_MAX_BYTES)
+            while chunk := await file.read(INGEST_CHUNK_BYTES):
+                spool.write(chunk)
+            spool.seek(0)
+            is_csv = (file.filename or "").lower().endswith(".csv")
+            return StreamingResponse(_ingest_ndjson(spool, is_csv, recurring),
+                                     media_type="application/x-ndjson")
 
         blob = await file.read()
         year = default_year or datetime.now().year
 
-        # OCR/text extraction (your schedule_parser does this)
-        text = extract_text(file.filename, blob)
+        # OCR/text extraction (your schedule_parser does this); blocking, so off the loop
+        text = await asyncio.to_thread(extract_text, file.filename, blob)
 
         if use_llm:
             try:
-                parsed = llm_parse_schedule(text, year, tz=TZ)
+                # several blocking Ollama calls joined on a pool → run on a worker thread
+                parsed = await http_client.run_limited("schedule_llm", llm_parse_schedule, text, year, tz=TZ)
                 events = parsed.get("events", [])
                 assumptions = parsed.get("assumptions", [])
                 return JSONResponse({"proposed": events, "assumptions": assumptions, "used": "llm"})
             except Exception as e:
                 # FALLBACK to rule-based if LLM path fails
-                events = parse_schedule(file.filename, blob, year)
+                events = await asyncio.to_thread(parse_schedule, file.filename, blob, year,
+                                                 recurring=recurring, tz=TZ)
                 return JSONResponse({
                     "proposed": events,
                     "assumptions": [f"LLM parse failed → fallback to rule parser: {e}"],
@@ -415,7 +724,7 @@ async def schedule_ingest(
                 })
 
         # rule-based path (no LLM)
-        events = parse_schedule(file.filename, blob, year)
+        events = await asyncio.to_thread(parse_schedule, file.filename, blob, year, recurring=recurring, tz=TZ)
         return JSONResponse({"proposed": events, "assumptions": [], "used": "rule"})
 
     except Exception as e:
@@ -425,21 +734,22 @@ async def schedule_ingest(
 @app.post("/schedule/commit")
 def schedule_commit(payload: dict):
     """
-    payload: { "events":[{"summary","start","end","location","description"}] }
-    Creates events in Google Calendar.
+    payload: { "events":[{"summary","start","end","location","description"}], "stream": false }
+    Creates events in Google Calendar via batch requests (50 inserts per HTTP call).
+    stream=true → NDJSON progress lines, ending with a {"type":"result"} line.
+    Returns: {created:[{index,id,htmlLink}], failed:[{index,error,...}]}
     """
+    events = payload.get("events", [])
+    if payload.get("stream"):
+        def lines():
+            try:
+                for msg in iter_add_events_batch(events, tz_str="America/Phoenix"):
+                    yield json.dumps(msg) + "\n"
+            except Exception as e:
+                yield json.dumps({"type": "error", "detail": f"schedule_commit_failed: {e}"}) + "\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
     try:
-        created = []
-        for e in payload.get("events", []):
-            c = add_event(
-                summary=e.get("summary","(no title)"),
-                start_iso_local=e.get("start"),
-                end_iso_local=e.get("end"),
-                description=e.get("description",""),
-                location=e.get("location",""),
-                tz_str="America/Phoenix"
-            )
-            created.append({"id": c.get("id"), "htmlLink": c.get("htmlLink")})
-        return JSONResponse({"created": created})
+        out = add_events_batch(events, tz_str="America/Phoenix")
+        return JSONResponse({"created": out.get("created", []), "failed": out.get("failed", [])})
     except Exception as e:
-        raise HTTPException(status_code=400, detail=f"schedule_commit_failed: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=f"schedule_commit_failed: {e}")
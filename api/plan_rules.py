@@ -0,0 +1,155 @@
+# api/plan_rules.py
+"""
+Deterministic fast path for agent.plan_event.
+
+Scores each upcoming event against keyword/feature rules per scenario
+(summary, location, start hour). When one event maps to a scenario with
+enough confidence the plan is built from templates and the LLM is skipped;
+anything ambiguous returns None and the caller falls back to llm_complete.
+"""
+import os, re, threading, datetime as dt
+from typing import Any, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+TZ = "America/Phoenix"
+PLAN_RULES_ENABLED = os.getenv("PLAN_RULES_ENABLED", "true").lower() == "true"
+PLAN_RULES_MIN_SCORE = float(os.getenv("PLAN_RULES_MIN_SCORE", "2"))   # best scenario score
+PLAN_RULES_MIN_MARGIN = float(os.getenv("PLAN_RULES_MIN_MARGIN", "1"))  # over the runner-up
+RAIN_PCT = 40  # precip probability that earns an umbrella
+
+# (pattern, weight) per scenario, matched against "summary location" (lower-cased)
+_RULES: Dict[str, List[Tuple[str, float]]] = {
+    "interview": [(r"\binterview", 3), (r"\bon-?site\b", 2), (r"\brecruiter\b", 2),
+                  (r"\bphone screen|\bscreening\b", 2), (r"\bhiring\b", 1)],
+    "child_birthday": [(r"\bbirthday party\b", 3), (r"\bb-?day\b|\bbirthday\b", 2),
+                       (r"\b(kid|kids|son|daughter|child)\b", 1), (r"\b(party|bounce|chuck e)", 1)],
+    "dinner_date": [(r"\bdate night\b|\bdinner date\b", 3), (r"\banniversary\b", 2),
+                    (r"\bdinner\b", 1), (r"\b(date|romantic)\b", 1), (r"\b(restaurant|bistro|grill|trattoria)\b", 1)],
+    "outdoor_event": [(r"\b(hike|hiking|picnic|bbq|barbecue|festival|5k|10k|marathon|camping)\b", 3),
+                      (r"\b(park|trail|beach|lake|stadium|field)\b", 1), (r"\b(game|concert|run)\b", 1)],
+    "generic_meeting": [(r"\b(meeting|standup|stand-up|sync|1:1|one-on-one|review|call|office hours)\b", 2),
+                        (r"\b(lecture|class|seminar|workshop)\b", 2), (r"\b(zoom|teams|meet\.google)\b", 1)],
+}
+
+# specific scenarios win over a generic meeting when several events are confident
+_PRIORITY = ["interview", "child_birthday", "dinner_date", "outdoor_event", "generic_meeting"]
+
+_TEMPLATES: Dict[str, Dict[str, List[str]]] = {
+    "interview": {
+        "checklist": ["printed resume (3 copies)", "portfolio / notes", "pen and notepad",
+                      "ID", "water", "phone charger"],
+        "questions": ["Do you need a belt, tie or other outfit item?", "What's your budget for missing items?",
+                      "Do you need a coffee on the way?"],
+    },
+    "child_birthday": {
+        "checklist": ["gift", "birthday card", "gift wrap", "RSVP confirmed", "water", "snacks for the drive"],
+        "questions": ["Do you already have a gift?", "What's your gift budget?",
+                      "Do you need a card or wrapping on the way?"],
+    },
+    "dinner_date": {
+        "checklist": ["reservation confirmed", "outfit ready", "wallet / card", "phone charged", "breath mints"],
+        "questions": ["Do you want flowers on the way?", "What's your budget for a small gift?"],
+    },
+    "outdoor_event": {
+        "checklist": ["water bottle", "sunscreen", "hat", "comfortable shoes", "snacks", "phone charger"],
+        "questions": ["Do you have enough water and sunscreen?", "Do you need to pick up snacks on the way?"],
+    },
+    "generic_meeting": {
+        "checklist": ["agenda / notes", "laptop", "charger", "water", "pen"],
+        "questions": ["Do you need a coffee on the way?", "Anything to print before you leave?"],
+    },
+}
+
+_stats_lock = threading.Lock()
+_stats = {"rule_hits": 0, "llm_fallbacks": 0}
+
+# ── Features ──────────────────────────────────────────────────────────────────
+def _start_local(e: Dict[str, Any], tz: str) -> Optional[dt.datetime]:
+    s = e.get("start")
+    if not s or "T" not in str(s):
+        return None
+    try:
+        d = dt.datetime.fromisoformat(str(s).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return d.astimezone(ZoneInfo(tz)) if d.tzinfo else d.replace(tzinfo=ZoneInfo(tz))
+
+def _scores(e: Dict[str, Any], tz: str) -> Dict[str, float]:
+    text = f"{e.get('summary') or ''} {e.get('location') or ''}".lower()
+    out = {sc: sum(w for pat, w in rules if re.search(pat, text)) for sc, rules in _RULES.items()}
+    start = _start_local(e, tz)
+    if start is not None:
+        if start.hour >= 17 and out["dinner_date"]:
+            out["dinner_date"] += 1        # an evening "dinner" is most likely the date scenario
+        if start.weekday() >= 5 and out["child_birthday"]:
+            out["child_birthday"] += 1     # kids' parties land on weekends
+    if e.get("hangoutLink"):
+        out["generic_meeting"] += 1
+    return out
+
+def classify(e: Dict[str, Any], tz: str = TZ) -> Tuple[Optional[str], float]:
+    """(scenario, score) when confident, else (None, best_score)."""
+    ranked = sorted(_scores(e, tz).items(), key=lambda kv: kv[1], reverse=True)
+    (best, s1), (_, s2) = ranked[0], ranked[1]
+    if s1 >= PLAN_RULES_MIN_SCORE and s1 - s2 >= PLAN_RULES_MIN_MARGIN:
+        return best, s1
+    return None, s1
+
+def _wet(weather_brief: str) -> bool:
+    """Umbrella check: the brief's "Rain NN%" label (≥ RAIN_PCT) or a wet word outside it."""
+    w = (weather_brief or "").lower()
+    m = re.search(r"\brain (\d+)%", w)
+    if m and int(m.group(1)) >= RAIN_PCT:
+        return True
+    return bool(re.search(r"\b(rain|storm|thunder|shower|drizzle)", re.sub(r"\brain \S*%", "", w)))
+
+# ── Plan ──────────────────────────────────────────────────────────────────────
+def _upcoming(events: List[Dict[str, Any]], tz: str) -> List[Dict[str, Any]]:
+    now = dt.datetime.now(ZoneInfo(tz))
+    out = []
+    for e in events[:6]:
+        start = _start_local(e, tz)
+        if start is None or start >= now - dt.timedelta(minutes=30):
+            out.append(e)
+    return out
+
+def rule_plan(events: List[Dict[str, Any]], weather_brief: str = "", tz: str = TZ) -> Optional[Dict[str, Any]]:
+    """
+    Plan with the same keys as the LLM's, or None when the events are ambiguous.
+    A confident specific scenario wins outright; a generic meeting only wins if
+    no other upcoming event is left unclassified (the LLM might rank it higher).
+    """
+    if not PLAN_RULES_ENABLED:
+        return None
+    upcoming = _upcoming(events, tz)
+    labelled = [(classify(e, tz)[0], i, e) for i, e in enumerate(upcoming)]
+    confident = [(sc, i, e) for sc, i, e in labelled if sc]
+    if not confident:
+        return None
+    sc, _, ev = min(confident, key=lambda t: (_PRIORITY.index(t[0]), t[1]))
+    if sc == "generic_meeting" and len(confident) < len(labelled):
+        return None
+
+    tpl = _TEMPLATES[sc]
+    checklist = list(tpl["checklist"])
+    if _wet(weather_brief):
+        checklist.insert(0, "umbrella")
+    return {
+        "scenario": sc,
+        "event_title": ev.get("summary") or "Upcoming",
+        "event_time": ev.get("start"),
+        "venue": ev.get("location"),
+        "checklist": checklist[:7],
+        "questions": list(tpl["questions"]),
+        "source": "rules",
+    }
+
+def record(hit: bool):
+    with _stats_lock:
+        _stats["rule_hits" if hit else "llm_fallbacks"] += 1
+
+def stats() -> Dict[str, Any]:
+    with _stats_lock:
+        total = _stats["rule_hits"] + _stats["llm_fallbacks"]
+        return {**_stats, "hit_ratio": round(_stats["rule_hits"] / total, 3) if total else 0.0,
+                "enabled": PLAN_RULES_ENABLED}
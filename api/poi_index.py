@@ -0,0 +1,193 @@
+# api/poi_index.py
+"""
+Local spatial index (SQLite R*Tree) of OSM POIs for the OTW categories.
+
+Bulk-import a bounding box once, or periodically via POI_BBOX + the scheduler:
+    python -m api.poi_index --bbox 33.30,-112.10,33.55,-111.80
+search_along_route then answers from disk in milliseconds and only falls back
+to Overpass when the route isn't covered by a fresh import.
+"""
+import os, json, math, time, sqlite3, threading, argparse
+from typing import Dict, Any, List, Tuple, Optional
+
+from api import geo
+
+DB_PATH = os.getenv("POI_DB_PATH", "data/poi_index.sqlite")
+POI_BBOX = os.getenv("POI_BBOX", "")  # "south,west,north,east"
+POI_MAX_AGE_DAYS = float(os.getenv("POI_MAX_AGE_DAYS", "30"))
+
+Bbox = Tuple[float, float, float, float]  # south, west, north, east
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS poi (
+    rid INTEGER PRIMARY KEY,
+    osm_id TEXT NOT NULL,
+    category TEXT NOT NULL,
+    name TEXT, phone TEXT, address TEXT, url TEXT,
+    lat REAL NOT NULL, lon REAL NOT NULL,
+    tags TEXT,
+    UNIQUE(osm_id, category)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS poi_rtree USING rtree(rid, min_lat, max_lat, min_lon, max_lon);
+CREATE TABLE IF NOT EXISTS coverage (
+    category TEXT NOT NULL,
+    south REAL, west REAL, north REAL, east REAL,
+    imported_at REAL
+);
+"""
+
+_write_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+def _connect() -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(DB_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(DB_PATH, timeout=10)
+    conn.executescript(_SCHEMA)
+    return conn
+
+def parse_bbox(s: str) -> Optional[Bbox]:
+    try:
+        s_, w, n, e = (float(x) for x in s.split(","))
+    except Exception:
+        return None
+    return (s_, w, n, e)
+
+# ── Geometry ──────────────────────────────────────────────────────────────────
+def _bbox_around(points: List[Tuple[float, float]], radius_m: float) -> Bbox:
+    lats = [p[0] for p in points]
+    lons = [p[1] for p in points]
+    dlat = radius_m / geo.M_PER_DEG_LAT
+    dlon = radius_m / (geo.M_PER_DEG_LAT * max(0.01, math.cos(math.radians(sum(lats) / len(lats)))))
+    return (min(lats) - dlat, min(lons) - dlon, max(lats) + dlat, max(lons) + dlon)
+
+# ── Coverage / lookup ─────────────────────────────────────────────────────────
+def covers(category: str, bbox: Bbox, conn: Optional[sqlite3.Connection] = None) -> bool:
+    own = conn is None
+    conn = conn or _connect()
+    try:
+        min_ts = time.time() - POI_MAX_AGE_DAYS * 86400
+        row = conn.execute(
+            "SELECT 1 FROM coverage WHERE category = ? AND imported_at >= ? "
+            "AND south <= ? AND west <= ? AND north >= ? AND east >= ? LIMIT 1",
+            (category, min_ts, bbox[0], bbox[1], bbox[2], bbox[3]),
+        ).fetchone()
+        return row is not None
+    finally:
+        if own:
+            conn.close()
+
+def fresh(bbox: Bbox) -> bool:
+    """True when every OTW category has a fresh import covering bbox."""
+    from api.tools_places_osm import _OSM_FILTERS
+    if not os.path.exists(DB_PATH):
+        return False
+    conn = _connect()
+    try:
+        return all(covers(c, bbox, conn) for c in _OSM_FILTERS)
+    finally:
+        conn.close()
+
+def lookup(category: str, line: List[Tuple[float, float]], radius_m: float = 800) -> Optional[List[Dict[str, Any]]]:
+    """
+    Places of `category` within radius_m of the (lat,lon) polyline, nearest first.
+    Returns None when the index doesn't cover the corridor (caller falls back to Overpass).
+    """
+    category = category.lower()
+    if not line or not os.path.exists(DB_PATH):
+        _stats["misses"] += 1
+        return None
+    bbox = _bbox_around(line, radius_m)
+    conn = _connect()
+    try:
+        if not covers(category, bbox, conn):
+            _stats["misses"] += 1
+            return None
+        rows = conn.execute(
+            "SELECT p.osm_id, p.name, p.phone, p.address, p.url, p.lat, p.lon, p.tags "
+            "FROM poi_rtree r JOIN poi p ON p.rid = r.rid "
+            "WHERE p.category = ? AND r.min_lat <= ? AND r.max_lat >= ? AND r.min_lon <= ? AND r.max_lon >= ?",
+            (category, bbox[2], bbox[0], bbox[3], bbox[1]),
+        ).fetchall()
+    finally:
+        conn.close()
+    _stats["hits"] += 1
+
+    dist_m, _ = geo.corridor([(r[5], r[6]) for r in rows], line, max_dist_m=radius_m)
+    out = []
+    for (osm_id, name, phone, address, url, lat, lon, tags), d in zip(rows, dist_m):
+        if d > radius_m:
+            continue
+        out.append({"id": osm_id, "name": name, "phone": phone, "address": address, "url": url,
+                    "lat": lat, "lon": lon, "tags": json.loads(tags or "{}"), "route_dist_m": round(float(d))})
+    out.sort(key=lambda p: p["route_dist_m"])
+    return out
+
+# ── Import ────────────────────────────────────────────────────────────────────
+def _overpass_bbox_query(bbox: Bbox, filters: List[str]) -> str:
+    b = f"({bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]})"
+    body = "".join(f"node[{f}]{b};way[{f}]{b};" for f in filters)
+    return f"[out:json][timeout:180];({body});out center;"
+
+def import_bbox(bbox: Bbox, categories: Optional[List[str]] = None) -> Dict[str, int]:
+    """Replace the indexed POIs inside bbox with a fresh Overpass pull; returns counts per category."""
+    from api import http_client
+    from api.tools_places_osm import OVERPASS, _OSM_FILTERS, _parse_elements
+
+    counts: Dict[str, int] = {}
+    for cat in categories or list(_OSM_FILTERS):
+        cat = cat.lower()
+        filters = _OSM_FILTERS.get(cat)
+        if not filters:
+            continue
+        r = http_client.post(OVERPASS, data={"data": _overpass_bbox_query(bbox, filters)}, timeout=200)
+        r.raise_for_status()
+        places = [p for p in _parse_elements(r.json().get("elements", []))
+                  if p.get("lat") is not None and p.get("lon") is not None]
+        with _write_lock:
+            conn = _connect()
+            try:
+                with conn:
+                    stale = [row[0] for row in conn.execute(
+                        "SELECT rid FROM poi WHERE category = ? AND lat BETWEEN ? AND ? AND lon BETWEEN ? AND ?",
+                        (cat, bbox[0], bbox[2], bbox[1], bbox[3]))]
+                    conn.executemany("DELETE FROM poi_rtree WHERE rid = ?", [(r_,) for r_ in stale])
+                    conn.executemany("DELETE FROM poi WHERE rid = ?", [(r_,) for r_ in stale])
+                    for p in places:
+                        cur = conn.execute(
+                            "INSERT OR REPLACE INTO poi (osm_id, category, name, phone, address, url, lat, lon, tags) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            (p["id"], cat, p["name"], p.get("phone"), p.get("address"), p.get("url"),
+                             p["lat"], p["lon"], json.dumps(p.get("tags") or {})))
+                        conn.execute("INSERT OR REPLACE INTO poi_rtree VALUES (?, ?, ?, ?, ?)",
+                                     (cur.lastrowid, p["lat"], p["lat"], p["lon"], p["lon"]))
+                    conn.execute("DELETE FROM coverage WHERE category = ? AND south >= ? AND west >= ? "
+                                 "AND north <= ? AND east <= ?", (cat, *bbox))
+                    conn.execute("INSERT INTO coverage VALUES (?, ?, ?, ?, ?, ?)", (cat, *bbox, time.time()))
+            finally:
+                conn.close()
+        counts[cat] = len(places)
+    return counts
+
+def stats() -> Dict[str, Any]:
+    out: Dict[str, Any] = dict(_stats)
+    if os.path.exists(DB_PATH):
+        conn = _connect()
+        try:
+            out["pois"] = dict(conn.execute("SELECT category, COUNT(*) FROM poi GROUP BY category").fetchall())
+            out["coverage"] = [
+                {"category": c, "bbox": [s, w, n, e], "imported_at": ts}
+                for c, s, w, n, e, ts in conn.execute("SELECT * FROM coverage").fetchall()
+            ]
+        finally:
+            conn.close()
+    return out
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Bulk-import OSM POIs for OTW lookups")
+    ap.add_argument("--bbox", default=POI_BBOX, help="south,west,north,east")
+    ap.add_argument("--category", action="append", help="limit to these categories (repeatable)")
+    args = ap.parse_args()
+    box = parse_bbox(args.bbox)
+    if not box:
+        raise SystemExit("need --bbox south,west,north,east (or POI_BBOX)")
+    print(json.dumps(import_bbox(box, args.category)))
@@ -1,4 +1,5 @@
-import json, re
+import os, json, re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date, timedelta
 from typing import List, Dict, Any, Optional
 from zoneinfo import ZoneInfo
@@ -7,6 +8,11 @@ from api.llm import llm_complete
 
 TZ = "America/Phoenix"
 
+# Long schedules are split into line-aligned chunks parsed by concurrent calls.
+CHUNK_CHARS = int(os.getenv("LLM_SCHEDULE_CHUNK_CHARS", "1500"))
+CHUNK_CONCURRENCY = int(os.getenv("LLM_SCHEDULE_CONCURRENCY", "2"))  # match Ollama's in-flight cap
+CHUNK_NUM_PREDICT = int(os.getenv("LLM_SCHEDULE_NUM_PREDICT", "1024"))
+
 _SCHEDULE_PROMPT = """You are extracting events from a messy schedule.
 Return STRICT JSON only, no prose.
 
@@ -106,14 +112,77 @@ def normalize_llm_events(raw: Dict[str, Any], today: date, tz: str, default_year
         })
     return {"events": events, "assumptions": assumptions}
 
-def llm_parse_schedule(free_text: str, default_year: int, tz: str = TZ) -> Dict[str, Any]:
-    today = date.today()
+def _chunk_lines(text: str, max_chars: int) -> List[str]:
+    """
+    Split on line boundaries into chunks of <= max_chars (an overlong line is its own chunk).
+    Later chunks start with the document's first line (e.g. a CSV column row) so they
+    keep their column meaning; it counts against max_chars and is skipped if it would
+    take more than half of it.
+    """
+    lines = [line for line in text.splitlines() if line.strip()]
+    header = lines[0] if lines and len(lines[0]) + 1 <= max_chars // 2 else None
+    chunks: List[str] = []
+    cur: List[str] = []
+    size = 0
+    for line in lines:
+        if cur and size + len(line) + 1 > max_chars:
+            chunks.append("\n".join(cur))
+            cur, size = ([header], len(header) + 1) if header else ([], 0)
+        cur.append(line)
+        size += len(line) + 1
+    if cur:
+        chunks.append("\n".join(cur))
+    return chunks
+
+def _parse_chunk(text: str, today: date, tz: str, default_year: int) -> Dict[str, Any]:
     user_payload = {
         "today": today.strftime("%Y-%m-%d"),
         "timezone": tz,
         "default_year": default_year,
-        "text": free_text
+        "text": text
+    }
+    out = llm_complete(_SCHEDULE_PROMPT, json.dumps(user_payload), {"num_predict": CHUNK_NUM_PREDICT},
+                       validate=lambda s: isinstance(_json_first_obj(s), dict))
+    return _json_first_obj(out)
+
+def _dedupe(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    seen = set()
+    out = []
+    for e in events:
+        k = (e["summary"].lower(), e["start"], e["end"])
+        if k not in seen:
+            seen.add(k)
+            out.append(e)
+    return out
+
+def llm_parse_schedule(free_text: str, default_year: int, tz: str = TZ) -> Dict[str, Any]:
+    """
+    Parse free text into events. The text is split into line-aligned chunks that are
+    parsed concurrently (at most LLM_SCHEDULE_CONCURRENCY calls in flight), then merged
+    and de-duplicated. A failed chunk becomes an assumption; if every chunk fails, raises.
+    """
+    today = date.today()
+    chunks = _chunk_lines(free_text, CHUNK_CHARS) or [free_text]
+    if len(chunks) == 1:
+        results = [_parse_chunk(chunks[0], today, tz, default_year)]
+        errors: List[str] = []
+    else:
+        with ThreadPoolExecutor(max_workers=max(1, min(CHUNK_CONCURRENCY, len(chunks)))) as pool:
+            futs = [pool.submit(_parse_chunk, c, today, tz, default_year) for c in chunks]
+        results, errors = [], []
+        for i, f in enumerate(futs):
+            try:
+                results.append(f.result())
+            except Exception as e:
+                errors.append(f"chunk {i + 1}/{len(chunks)} failed: {e}")
+        if not results:
+            raise ValueError("; ".join(errors))
+
+    merged = {
+        "events": [e for r in results for e in (r.get("events") or [])],
+        "assumptions": [a for r in results for a in (r.get("assumptions") or [])] + errors,
     }
-    out = llm_complete(_SCHEDULE_PROMPT, json.dumps(user_payload))
-    raw = _json_first_obj(out)
-    return normalize_llm_events(raw, today, tz, default_year)
\ No newline at end of file
+    norm = normalize_llm_events(merged, today, tz, default_year)
+    norm["events"] = _dedupe(norm["events"])
+    norm["assumptions"] = list(dict.fromkeys(norm["assumptions"]))
+    return norm
@@ -1,7 +1,9 @@
 # api/schedule_parser.py
 import csv, io, re
-from typing import List, Dict, Any, Optional
-from datetime import datetime, date, timedelta
+from itertools import islice
+from typing import List, Dict, Any, Optional, Iterable, Iterator
+from datetime import datetime, date, time, timedelta, timezone
+from zoneinfo import ZoneInfo
 
 # ── Day parsing ────────────────────────────────────────────────────────────────
 _DAY_ALIASES = {
@@ -99,17 +101,35 @@ def _iter_weekdays_between(start: date, end: date, wdays: List[int]):
             yield cur
         cur += timedelta(days=1)
 
-# ── CSV → events ──────────────────────────────────────────────────────────────
-def parse_csv(blob: bytes, max_events: int = 400) -> List[Dict[str, Any]]:
+# ── Recurrence ────────────────────────────────────────────────────────────────
+_RRULE_DAYS = ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]
+
+def _first_weekday_on_or_after(start: date, wdays: List[int]) -> Optional[date]:
+    for i in range(7):
+        d = start + timedelta(days=i)
+        if d.weekday() in wdays:
+            return d
+    return None
+
+def _weekly_rrule(wdays: List[int], until: date, tz: str) -> str:
     """
-    Expects headers: title, days, times, dates, location
-    Emits discrete events with local ISO 'YYYY-MM-DDTHH:MM' start/end.
+    RRULE for a weekly class. UNTIL must be UTC when DTSTART carries a zone, so take
+    the end date's local 23:59:59 and convert — the last class still falls inside it.
     """
-    txt = blob.decode("utf-8", errors="ignore")
-    rdr = csv.DictReader(io.StringIO(txt))
-    events: List[Dict[str, Any]] = []
+    until_local = datetime.combine(until, time(23, 59, 59), tzinfo=ZoneInfo(tz))
+    until_utc = until_local.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    byday = ",".join(_RRULE_DAYS[d] for d in sorted(wdays))
+    return f"RRULE:FREQ=WEEKLY;BYDAY={byday};UNTIL={until_utc}"
 
-    for row in rdr:
+# ── CSV → events ──────────────────────────────────────────────────────────────
+def iter_csv_events(lines: Iterable[str], recurring: bool = False,
+                    tz: str = "America/Phoenix") -> Iterator[Dict[str, Any]]:
+    """
+    Row-by-row core of parse_csv: `lines` is any iterable of CSV text lines (a list,
+    a StringIO, a TextIOWrapper over an upload), so memory stays flat for large files.
+    Yields the same event dicts parse_csv returns.
+    """
+    for row in csv.DictReader(lines):
         title = (row.get("title") or row.get("Title") or "").strip() or "(untitled)"
         days  = (row.get("days")  or row.get("Days")  or "").strip()
         times = (row.get("times") or row.get("Times") or "").strip()
@@ -132,31 +152,52 @@ def parse_csv(blob: bytes, max_events: int = 400) -> List[Dict[str, Any]]:
             # single-day
             start_iso = f"{d_start.isoformat()}T{t_start}"
             end_iso = f"{d_start.isoformat()}T{t_end}" if t_end else None
-            events.append({"summary": title, "start": start_iso, "end": end_iso,
-                           "location": loc, "notes": notes})
-        else:
-            if not wdays:
-                # no days → assume the first day-of-week of start date
-                wdays = [d_start.weekday()]
-            for d in _iter_weekdays_between(d_start, d_end, wdays):
-                start_iso = f"{d.isoformat()}T{t_start}"
-                end_iso = f"{d.isoformat()}T{t_end}" if t_end else None
-                events.append({"summary": title, "start": start_iso, "end": end_iso,
-                               "location": loc, "notes": notes})
-                if len(events) >= max_events:
-                    break
-        if len(events) >= max_events:
-            break
-
-    return events
+            yield {"summary": title, "start": start_iso, "end": end_iso,
+                   "location": loc, "notes": notes}
+            continue
+
+        if not wdays:
+            # no days → assume the first day-of-week of start date
+            wdays = [d_start.weekday()]
+        if recurring:
+            first = _first_weekday_on_or_after(d_start, wdays)
+            if first is None or first > d_end:
+                continue
+            yield {"summary": title,
+                   "start": f"{first.isoformat()}T{t_start}",
+                   "end": f"{first.isoformat()}T{t_end}" if t_end else None,
+                   "location": loc, "notes": notes,
+                   "recurrence": [_weekly_rrule(wdays, d_end, tz)]}
+            continue
+        for d in _iter_weekdays_between(d_start, d_end, wdays):
+            start_iso = f"{d.isoformat()}T{t_start}"
+            end_iso = f"{d.isoformat()}T{t_end}" if t_end else None
+            yield {"summary": title, "start": start_iso, "end": end_iso,
+                   "location": loc, "notes": notes}
+
+def parse_csv(blob: bytes, max_events: int = 400, recurring: bool = False,
+              tz: str = "America/Phoenix") -> List[Dict[str, Any]]:
+    """
+    Expects headers: title, days, times, dates, location
+    Emits discrete events with local ISO 'YYYY-MM-DDTHH:MM' start/end.
+    recurring=True: one event per row instead, starting on the first class day and
+    carrying "recurrence": ["RRULE:FREQ=WEEKLY;BYDAY=..;UNTIL=.."]; max_events is
+    not applied (a row is one event however long the term is).
+    """
+    txt = blob.decode("utf-8", errors="ignore")
+    it = iter_csv_events(io.StringIO(txt), recurring=recurring, tz=tz)
+    if recurring:
+        return list(it)
+    return list(islice(it, max_events))
 
 # Maintain the same API your main.py expects
 def extract_text(filename: str, blob: bytes) -> str:
     # CSV-only mode: we don’t OCR; keep compat signature.
     return blob.decode("utf-8", errors="ignore")
 
-def parse_schedule(filename: str, blob: bytes, default_year: int) -> List[Dict[str, Any]]:
+def parse_schedule(filename: str, blob: bytes, default_year: int,
+                   recurring: bool = False, tz: str = "America/Phoenix") -> List[Dict[str, Any]]:
     # Only parse CSVs in this mode; ignore other file types.
     if not filename.lower().endswith(".csv"):
         return []
-    return parse_csv(blob)
\ No newline at end of file
+    return parse_csv(blob, recurring=recurring, tz=tz)
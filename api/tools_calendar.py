@@ -1,12 +1,13 @@
 # api/tools_calendar.py
 
-import os
-from typing import List, Dict, Any, Optional
+import os, json, time, hashlib, threading
+from typing import List, Dict, Any, Optional, Iterator
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request  # for token refresh
 
@@ -40,34 +41,106 @@ def _client_config() -> dict:
 # Auth / Service
 # ──────────────────────────────────────────────────────────────────────────────
 
-def _ensure_creds() -> Credentials:
-    """Load or create OAuth credentials; opens a browser on first run."""
-    os.makedirs(os.path.dirname(TOKEN_PATH), exist_ok=True)
+# Long-lived client state, per token file (one per user; TOKEN_PATH is the local
+# single-user default). Credentials are shared process-wide; discovery clients
+# (httplib2 underneath, not thread-safe) are built once per thread. A slow refresh
+# or an unfinished browser consent only blocks callers of that same token.
+_creds: Dict[str, Credentials] = {}
+_token_json: Dict[str, str] = {}        # last persisted token, to skip no-op writes
+_creds_lock = threading.Lock()         # short: guards the dicts and metrics only
+_token_locks: Dict[str, threading.Lock] = {}  # per token: held across load/refresh/consent
+_local = threading.local()
+_metrics = {"builds": 0, "refreshes": 0, "refresh_failures": 0, "auth_flows": 0,
+            "token_loads": 0, "token_writes": 0}
 
-    creds: Optional[Credentials] = None
-    if os.path.exists(TOKEN_PATH):
-        creds = Credentials.from_authorized_user_file(TOKEN_PATH, SCOPES)
+def _persist_token(creds: Credentials, token_path: str):
+    """Write the token file only when its content actually changed (atomic replace)."""
+    data = creds.to_json()
+    if data == _token_json.get(token_path):
+        return
+    tmp = token_path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(data)
+    os.replace(tmp, token_path)
+    _token_json[token_path] = data
+    _count("token_writes")
 
-    # Refresh or (re)authorize
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            try:
-                creds.refresh(Request())
-            except Exception:
-                creds = None
-        if not creds:
-            flow = InstalledAppFlow.from_client_config(_client_config(), SCOPES)
-            # Spins up a localhost receiver and opens a browser consent page
-            creds = flow.run_local_server(port=0)
-        with open(TOKEN_PATH, "w") as f:
-            f.write(creds.to_json())
-
-    return creds
-
-def _svc():
-    """Build Calendar API client (discovery cache disabled to avoid file warnings)."""
-    creds = _ensure_creds()
-    return build("calendar", "v3", credentials=creds, cache_discovery=False)
+def _count(name: str):
+    with _creds_lock:
+        _metrics[name] += 1
+
+def _token_lock(path: str) -> threading.Lock:
+    with _creds_lock:
+        return _token_locks.setdefault(path, threading.Lock())
+
+def _ensure_creds(token_path: Optional[str] = None, interactive: bool = False) -> Credentials:
+    """
+    Load or create OAuth credentials; refreshes only when expired. The browser consent
+    flow runs for the default TOKEN_PATH or when interactive=True — never from a
+    scheduled per-user job, which raises instead.
+    """
+    path = token_path or TOKEN_PATH
+    interactive = interactive or path == TOKEN_PATH
+    with _creds_lock:
+        creds = _creds.get(path)
+    if creds is not None and creds.valid:
+        return creds
+
+    with _token_lock(path):
+        with _creds_lock:
+            creds = _creds.get(path)  # another thread may have refreshed it meanwhile
+        if creds is not None and creds.valid:
+            return creds
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if creds is None and os.path.exists(path):
+            with open(path) as f:
+                _token_json[path] = f.read()
+            creds = Credentials.from_authorized_user_info(json.loads(_token_json[path]), SCOPES)
+            _count("token_loads")
+
+        # Refresh or (re)authorize
+        if not creds or not creds.valid:
+            if creds and creds.expired and creds.refresh_token:
+                try:
+                    creds.refresh(Request())
+                    _count("refreshes")
+                except Exception:
+                    _count("refresh_failures")
+                    creds = None
+            if not creds or not creds.valid:
+                if not interactive:
+                    raise RuntimeError(f"calendar_not_connected: no valid token at {path}")
+                flow = InstalledAppFlow.from_client_config(_client_config(), SCOPES)
+                # Spins up a localhost receiver and opens a browser consent page
+                creds = flow.run_local_server(port=0)
+                _count("auth_flows")
+            _persist_token(creds, path)
+
+        with _creds_lock:
+            _creds[path] = creds
+        return creds
+
+def _svc(token_path: Optional[str] = None, interactive: bool = False):
+    """Calendar API client for this thread and token, rebuilt only when the credentials object changes."""
+    creds = _ensure_creds(token_path, interactive)
+    svcs = getattr(_local, "svcs", None)
+    if svcs is None:
+        svcs = _local.svcs = {}
+    path = token_path or TOKEN_PATH
+    cached = svcs.get(path)
+    if cached is None or cached[0] is not creds:
+        # discovery cache disabled to avoid file warnings
+        cached = svcs[path] = (creds, build("calendar", "v3", credentials=creds, cache_discovery=False))
+        _count("builds")
+    return cached[1]
+
+def client_stats() -> Dict[str, Any]:
+    with _creds_lock:
+        default = _creds.get(TOKEN_PATH)
+        return {**_metrics, "creds_valid": bool(default is not None and default.valid),
+                "tokens_loaded": len(_creds), "sync": dict(_sync_metrics),
+                "stores": {p: len(st.get("events", {})) for p, st in _stores.items()}}
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Helpers
@@ -89,66 +162,196 @@ def _coerce_local_iso(s: Optional[str], tz_str: str) -> Optional[str]:
     # Assume caller already provided RFC3339 w/ tz
     return s
 
-def _window_today_tomorrow(tz_str: str) -> tuple[str, str]:
-    tz = ZoneInfo(tz_str)
-    now = datetime.now(tz)
-    start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    end = (start + timedelta(days=2)).replace(hour=0, minute=0, second=0, microsecond=0)
-    return start.isoformat(), end.isoformat()
+# ──────────────────────────────────────────────────────────────────────────────
+# Local event store (incremental sync)
+# ──────────────────────────────────────────────────────────────────────────────
+# One store per token file, in memory and persisted under CALENDAR_STORE_DIR.
+# A full sync lists [today, today + 2×CALENDAR_WINDOW_DAYS]; later syncs send
+# the syncToken and only get deltas. Reads filter the store locally and sync at most every
+# CALENDAR_SYNC_MIN_SEC. A 410 (token expired) or a window that has run out
+# triggers a fresh full sync.
+
+CALENDAR_LOCAL_STORE = os.getenv("CALENDAR_LOCAL_STORE", "true").lower() == "true"
+CALENDAR_WINDOW_DAYS = int(os.getenv("CALENDAR_WINDOW_DAYS", "14"))
+CALENDAR_SYNC_MIN_SEC = float(os.getenv("CALENDAR_SYNC_MIN_SEC", "60"))
+CALENDAR_STORE_DIR = os.getenv("CALENDAR_STORE_DIR", "data/calendar")
+
+_stores: Dict[str, Dict[str, Any]] = {}
+_store_locks: Dict[str, threading.Lock] = {}
+_sync_metrics = {"full_syncs": 0, "incremental_syncs": 0, "deltas": 0, "sync_resets": 0,
+                 "sync_failures": 0, "local_reads": 0, "stale_reads": 0}
+
+def _store_path(token_path: str) -> str:
+    # data/google_token.json → CALENDAR_STORE_DIR/default.json
+    # <uid>.google_token.json → CALENDAR_STORE_DIR/users/<uid>.json (kept out of USERS_DIR,
+    # where every *.json is read as a user config)
+    name = os.path.basename(token_path)
+    if name.endswith(".google_token.json"):
+        return os.path.join(CALENDAR_STORE_DIR, "users", name[:-len(".google_token.json")] + ".json")
+    return os.path.join(CALENDAR_STORE_DIR, "default.json")
+
+def _store_lock(path: str) -> threading.Lock:
+    with _creds_lock:
+        return _store_locks.setdefault(path, threading.Lock())
+
+def _ts(value: Optional[str], tz_str: str) -> Optional[float]:
+    """Epoch seconds for a Calendar dateTime (RFC3339) or all-day date."""
+    if not value:
+        return None
+    try:
+        if "T" not in value:
+            return datetime.fromisoformat(value).replace(tzinfo=ZoneInfo(tz_str)).timestamp()
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+def _slim(e: Dict[str, Any], tz_str: str) -> Dict[str, Any]:
+    start = e.get("start", {}).get("dateTime") or e.get("start", {}).get("date")
+    end = e.get("end", {}).get("dateTime") or e.get("end", {}).get("date")
+    return {
+        "id": e.get("id"),
+        "summary": e.get("summary"),
+        "start": start,
+        "end": end,
+        "location": e.get("location"),
+        "hangoutLink": e.get("hangoutLink"),
+        "_s": _ts(start, tz_str),
+        "_e": _ts(end, tz_str) or _ts(start, tz_str),
+    }
+
+def _load_store(path: str) -> Dict[str, Any]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except Exception:
+        return {"sync_token": None, "synced_until": None, "last_sync": 0.0, "events": {}}
+
+def _save_store(path: str, store: Dict[str, Any]):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(store, f)
+    os.replace(path + ".tmp", path)
+
+def _list_all(svc, **params) -> tuple:
+    """Page through events.list; returns (items, nextSyncToken)."""
+    items, page = [], None
+    while True:
+        resp = svc.events().list(calendarId="primary", singleEvents=True, maxResults=250,
+                                 pageToken=page, **params).execute()
+        items.extend(resp.get("items", []))
+        page = resp.get("nextPageToken")
+        if not page:
+            return items, resp.get("nextSyncToken")
+
+def _full_sync(svc, store: Dict[str, Any], tz_str: str):
+    start = datetime.now(ZoneInfo(tz_str)).replace(hour=0, minute=0, second=0, microsecond=0)
+    end = start + timedelta(days=2 * max(1, CALENDAR_WINDOW_DAYS))
+    items, token = _list_all(svc, timeMin=start.isoformat(), timeMax=end.isoformat())
+    store["events"] = {e["id"]: _slim(e, tz_str) for e in items if e.get("status") != "cancelled"}
+    store["sync_token"] = token
+    store["synced_until"] = end.timestamp()
+    _sync_metrics["full_syncs"] += 1
+
+def _incremental_sync(svc, store: Dict[str, Any], tz_str: str):
+    items, token = _list_all(svc, syncToken=store["sync_token"])
+    for e in items:
+        if e.get("status") == "cancelled":
+            store["events"].pop(e.get("id"), None)
+        else:
+            store["events"][e["id"]] = _slim(e, tz_str)
+    store["sync_token"] = token or store["sync_token"]
+    _sync_metrics["incremental_syncs"] += 1
+    _sync_metrics["deltas"] += len(items)
+
+def sync_events(token_path: Optional[str] = None, tz_str: str = TZ_DEFAULT, force: bool = False) -> Dict[str, Any]:
+    """Bring the local store up to date (no-op within CALENDAR_SYNC_MIN_SEC unless force)."""
+    path = token_path or TOKEN_PATH
+    spath = _store_path(path)
+    with _store_lock(spath):
+        store = _stores.get(spath) or _load_store(spath)
+        _stores[spath] = store
+        now = time.time()
+        if not force and now - store.get("last_sync", 0.0) < CALENDAR_SYNC_MIN_SEC:
+            return store
+        svc = _svc(token_path)
+        need_until = datetime.now(ZoneInfo(tz_str)).replace(hour=0, minute=0, second=0, microsecond=0) \
+            + timedelta(days=CALENDAR_WINDOW_DAYS)
+        if not store.get("sync_token") or (store.get("synced_until") or 0) < need_until.timestamp():
+            _full_sync(svc, store, tz_str)
+        else:
+            try:
+                _incremental_sync(svc, store, tz_str)
+            except HttpError as e:
+                if getattr(e.resp, "status", None) != 410:
+                    raise
+                _sync_metrics["sync_resets"] += 1  # sync token expired → start over
+                _full_sync(svc, store, tz_str)
+        # drop what ended more than a day ago; the store only ever serves forward windows
+        cutoff = now - 86400
+        store["events"] = {k: v for k, v in store["events"].items() if (v.get("_e") or now) >= cutoff}
+        store["last_sync"] = now
+        _save_store(spath, store)
+        return store
+
+def _mark_stale(token_path: Optional[str]):
+    """Our own writes should show up on the next read, so skip the sync throttle once."""
+    store = _stores.get(_store_path(token_path or TOKEN_PATH))
+    if store is not None:
+        store["last_sync"] = 0.0
+
+def _local_events(time_min: datetime, time_max: datetime, tz_str: str,
+                  token_path: Optional[str]) -> List[Dict[str, Any]]:
+    spath = _store_path(token_path or TOKEN_PATH)
+    try:
+        store = sync_events(token_path, tz_str)
+    except Exception:
+        # upstream down: serve the last synced copy if there is one
+        _sync_metrics["sync_failures"] += 1
+        store = _stores.get(spath)
+        if not store or not store.get("sync_token"):
+            raise
+        _sync_metrics["stale_reads"] += 1
+    _sync_metrics["local_reads"] += 1
+    lo, hi = time_min.timestamp(), time_max.timestamp()
+    hits = [e for e in list(store["events"].values())
+            if e.get("_s") is not None and e["_s"] < hi and (e.get("_e") or e["_s"]) > lo]
+    hits.sort(key=lambda e: e["_s"])
+    return [{k: v for k, v in e.items() if not k.startswith("_")} for e in hits]
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Public API
 # ──────────────────────────────────────────────────────────────────────────────
 
-def connect() -> Dict[str, Any]:
+def connect(token_path: Optional[str] = None) -> Dict[str, Any]:
     """
     Force an auth check; returns info on the primary calendar.
-    Triggers OAuth flow the first time and caches token.
+    Triggers OAuth flow the first time and caches token (at token_path for a user).
     """
-    svc = _svc()
+    svc = _svc(token_path, interactive=True)
     me = svc.calendarList().get(calendarId="primary").execute()
     return {
         "connected": True,
         "primary": me.get("summaryOverride") or me.get("summary") or "primary"
     }
 
-def get_events_today_and_tomorrow(tz_str: str = TZ_DEFAULT) -> List[Dict[str, Any]]:
-    svc = _svc()
-    time_min, time_max = _window_today_tomorrow(tz_str)
-    events_result = svc.events().list(
-        calendarId="primary",
-        timeMin=time_min,
-        timeMax=time_max,
-        singleEvents=True,
-        orderBy="startTime",
-    ).execute()
-    items = events_result.get("items", [])
-    out: List[Dict[str, Any]] = []
-    for e in items:
-        start = e.get("start", {}).get("dateTime") or e.get("start", {}).get("date")
-        end = e.get("end", {}).get("dateTime") or e.get("end", {}).get("date")
-        out.append({
-            "id": e.get("id"),
-            "summary": e.get("summary"),
-            "start": start,
-            "end": end,
-            "location": e.get("location"),
-            "hangoutLink": e.get("hangoutLink"),
-        })
-    return out
-
-def add_reminder(summary: str,
-                 when_iso_local: str,
-                 description: Optional[str] = None,
-                 minutes: int = 0,
-                 duration_minutes: int = 15,
-                 tz_str: str = TZ_DEFAULT) -> Dict[str, Any]:
+def get_events(days: int = 2, tz_str: str = TZ_DEFAULT, token_path: Optional[str] = None) -> List[Dict[str, Any]]:
     """
-    Creates a short event at the given local ISO time with a popup reminder X minutes before.
-    when_iso_local: 'YYYY-MM-DDTHH:MM' (local) or RFC3339 with tz.
+    Events from today 00:00 for `days` days (≤ CALENDAR_WINDOW_DAYS), served from
+    the local store; CALENDAR_LOCAL_STORE=false lists them from Google directly.
     """
-    svc = _svc()
+    days = max(1, min(days, CALENDAR_WINDOW_DAYS))
+    start = datetime.now(ZoneInfo(tz_str)).replace(hour=0, minute=0, second=0, microsecond=0)
+    end = start + timedelta(days=days)
+    if CALENDAR_LOCAL_STORE:
+        return _local_events(start, end, tz_str, token_path)
+    items, _ = _list_all(_svc(token_path), timeMin=start.isoformat(), timeMax=end.isoformat(), orderBy="startTime")
+    return [{k: v for k, v in _slim(e, tz_str).items() if not k.startswith("_")} for e in items]
 
+def get_events_today_and_tomorrow(tz_str: str = TZ_DEFAULT, token_path: Optional[str] = None) -> List[Dict[str, Any]]:
+    return get_events(2, tz_str, token_path)
+
+def _reminder_body(summary: str, when_iso_local: str, description: Optional[str],
+                   minutes: int, duration_minutes: int, tz_str: str) -> Dict[str, Any]:
     start_iso = _coerce_local_iso(when_iso_local, tz_str)
     if not start_iso:
         raise ValueError("start time is required")
@@ -156,7 +359,7 @@ def add_reminder(summary: str,
     dt0 = datetime.fromisoformat(start_iso)
     end_iso = (dt0 + timedelta(minutes=duration_minutes)).isoformat(timespec="minutes")
 
-    evt = {
+    return {
         "summary": summary or "(no title)",
         "description": description or "",
         "start": {"dateTime": start_iso, "timeZone": tz_str},
@@ -166,22 +369,68 @@ def add_reminder(summary: str,
             "overrides": [{"method": "popup", "minutes": int(minutes)}]
         }
     }
+
+def add_reminder(summary: str,
+                 when_iso_local: str,
+                 description: Optional[str] = None,
+                 minutes: int = 0,
+                 duration_minutes: int = 15,
+                 tz_str: str = TZ_DEFAULT,
+                 token_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Creates a short event at the given local ISO time with a popup reminder X minutes before.
+    when_iso_local: 'YYYY-MM-DDTHH:MM' (local) or RFC3339 with tz.
+    """
+    svc = _svc(token_path)
+    evt = _reminder_body(summary, when_iso_local, description, minutes, duration_minutes, tz_str)
     created = svc.events().insert(calendarId="primary", body=evt).execute()
+    _mark_stale(token_path)
     return {"id": created.get("id"), "htmlLink": created.get("htmlLink")}
 
-def add_event(summary: str,
-              start_iso_local: str,
-              end_iso_local: Optional[str],
-              description: str = "",
-              location: str = "",
-              tz_str: str = TZ_DEFAULT) -> Dict[str, Any]:
+def upsert_reminder(event_id: str,
+                    summary: str,
+                    when_iso_local: str,
+                    description: Optional[str] = None,
+                    minutes: int = 0,
+                    duration_minutes: int = 15,
+                    tz_str: str = TZ_DEFAULT,
+                    token_path: Optional[str] = None,
+                    exists: bool = False) -> Dict[str, Any]:
     """
-    Create a standard Calendar event.
-    start_iso_local/end_iso_local should be 'YYYY-MM-DDTHH:MM' (local) or RFC3339 with tz.
-    If end is missing or invalid, defaults to +60 minutes after start.
+    Like add_reminder, but under a caller-chosen event id (base32hex: a-v, 0-9; 5-1024 chars)
+    so repeated calls never duplicate: insert, and on 409 (id exists, possibly deleted)
+    update that event in place. exists=True (the caller already wrote this id) goes
+    straight to update and only inserts on 404.
+    Returns {"id", "htmlLink", "action": "inserted" | "updated"}.
     """
-    svc = _svc()
+    svc = _svc(token_path)
+    evt = _reminder_body(summary, when_iso_local, description, minutes, duration_minutes, tz_str)
+    evt["id"] = event_id
+    evt["status"] = "confirmed"  # revives the event if the user deleted it
+
+    def _insert():
+        return svc.events().insert(calendarId="primary", body=evt).execute(), "inserted"
+
+    def _update():
+        return svc.events().update(calendarId="primary", eventId=event_id, body=evt).execute(), "updated"
 
+    first, fallback, on = (_update, _insert, 404) if exists else (_insert, _update, 409)
+    try:
+        out, action = first()
+    except HttpError as e:
+        if getattr(e.resp, "status", None) != on:
+            raise
+        out, action = fallback()
+    _mark_stale(token_path)
+    return {"id": out.get("id"), "htmlLink": out.get("htmlLink"), "action": action}
+
+def _event_body(summary: str,
+                start_iso_local: str,
+                end_iso_local: Optional[str],
+                description: str = "",
+                location: str = "",
+                tz_str: str = TZ_DEFAULT,
+                recurrence: Optional[List[str]] = None) -> Dict[str, Any]:
     start_iso = _coerce_local_iso(start_iso_local, tz_str)
     if not start_iso:
         raise ValueError("start time is required (YYYY-MM-DDTHH:MM or RFC3339)")
@@ -209,5 +458,149 @@ def add_event(summary: str,
         "start": {"dateTime": start_iso, "timeZone": tz_str},
         "end":   {"dateTime": end_iso,   "timeZone": tz_str},
     }
+    if recurrence:
+        body["recurrence"] = list(recurrence)
+    return body
+
+def add_event(summary: str,
+              start_iso_local: str,
+              end_iso_local: Optional[str],
+              description: str = "",
+              location: str = "",
+              tz_str: str = TZ_DEFAULT,
+              recurrence: Optional[List[str]] = None,
+              token_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Create a standard Calendar event.
+    start_iso_local/end_iso_local should be 'YYYY-MM-DDTHH:MM' (local) or RFC3339 with tz.
+    If end is missing or invalid, defaults to +60 minutes after start.
+    recurrence: optional RRULE lines, e.g. ["RRULE:FREQ=WEEKLY;BYDAY=MO,WE;UNTIL=20251206T065959Z"].
+    """
+    svc = _svc(token_path)
+    body = _event_body(summary, start_iso_local, end_iso_local, description, location, tz_str, recurrence)
     created = svc.events().insert(calendarId="primary", body=body).execute()
-    return created
\ No newline at end of file
+    _mark_stale(token_path)
+    return created
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Bulk insert (Google batch requests)
+# ──────────────────────────────────────────────────────────────────────────────
+
+BATCH_MAX = 50  # Calendar API limit per batch request
+
+def _retryable(exc: Exception) -> bool:
+    status = getattr(getattr(exc, "resp", None), "status", None)
+    if status is None:
+        return True  # transport error
+    status = int(status)
+    if status == 403:
+        return "ratelimit" in str(exc).lower() or "usagelimits" in str(exc).lower()
+    return status == 429 or status >= 500
+
+def _batch_event_id(body: Dict[str, Any], index: int) -> str:
+    # Calendar ids are base32hex (a-v, 0-9); hashing body + row makes re-commits
+    # idempotent while identical rows in one payload stay distinct events
+    blob = json.dumps({"row": index, **{k: body.get(k) for k in
+                       ("summary", "start", "end", "location", "description", "recurrence")}}, sort_keys=True)
+    return "lcev" + hashlib.sha1(blob.encode()).hexdigest()[:24]
+
+def _resolve_existing(svc, i: int, body: Dict[str, Any]) -> Dict[str, Any]:
+    """409 on insert: the id exists. Keep a live event as is; revive one the user deleted."""
+    try:
+        cur = svc.events().get(calendarId="primary", eventId=body["id"]).execute()
+        action = "existing"
+        if cur.get("status") == "cancelled":
+            cur = svc.events().update(calendarId="primary", eventId=body["id"],
+                                      body={**body, "status": "confirmed"}).execute()
+            action = "revived"
+    except Exception as ex:
+        return {"index": i, "ok": False, "error": f"conflict_unresolved: {str(ex)[:300]}", "status": 409}
+    return {"index": i, "ok": True, "id": cur.get("id"), "htmlLink": cur.get("htmlLink"), "action": action}
+
+def iter_add_events_batch(events: List[Dict[str, Any]],
+                          tz_str: str = TZ_DEFAULT,
+                          chunk_size: int = BATCH_MAX,
+                          max_retries: int = 2,
+                          token_path: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Insert many events via batch requests of up to 50 inserts each.
+    Yields {"type":"progress", ...} after every batch, then one {"type":"result", ...}
+    with per-event outcomes. Only failed items with retryable errors (rate limit,
+    429, 5xx) are re-sent, with exponential backoff. Each body gets a deterministic
+    id (content + row), so a retry or re-commit of an insert Google already applied
+    comes back 409 and resolves to the existing event (revived if it was deleted)
+    instead of duplicating it.
+    events: [{"summary","start","end","description"|"notes","location","recurrence"?}]
+    """
+    chunk_size = max(1, min(chunk_size, BATCH_MAX))
+    total = len(events)
+    results: Dict[int, Dict[str, Any]] = {}
+    pending: List[tuple] = []
+    for i, e in enumerate(events):
+        try:
+            body = _event_body(
+                e.get("summary", "(no title)"), e.get("start"), e.get("end"),
+                e.get("description") or e.get("notes") or "", e.get("location") or "", tz_str,
+                e.get("recurrence"))
+            body["id"] = _batch_event_id(body, i)
+            pending.append((i, body))
+        except Exception as ex:
+            results[i] = {"index": i, "ok": False, "error": f"invalid_event: {ex}", "retryable": False}
+
+    svc = _svc(token_path) if pending else None
+    attempt = 0
+    while pending:
+        retry: List[tuple] = []
+        for c0 in range(0, len(pending), chunk_size):
+            chunk = pending[c0:c0 + chunk_size]
+            bodies = dict(chunk)
+            conflicts: List[int] = []
+
+            def _cb(request_id, response, exception):
+                i = int(request_id)
+                status = getattr(getattr(exception, "resp", None), "status", None)
+                if exception is None:
+                    results[i] = {"index": i, "ok": True, "id": response.get("id"), "htmlLink": response.get("htmlLink"),
+                                  "action": "inserted"}
+                elif str(status) == "409":
+                    conflicts.append(i)  # an earlier attempt or commit landed; resolved below
+                elif _retryable(exception) and attempt < max_retries:
+                    retry.append((i, bodies[i]))
+                else:
+                    results[i] = {"index": i, "ok": False, "error": str(exception)[:300], "status": status}
+
+            batch = svc.new_batch_http_request(callback=_cb)
+            for i, body in chunk:
+                batch.add(svc.events().insert(calendarId="primary", body=body), request_id=str(i))
+            try:
+                batch.execute()
+            except Exception as ex:
+                # whole batch failed in transport → every item in it is retryable
+                for i, body in chunk:
+                    if attempt < max_retries:
+                        retry.append((i, body))
+                    else:
+                        results[i] = {"index": i, "ok": False, "error": f"batch_failed: {ex}"}
+            for i in conflicts:
+                results[i] = _resolve_existing(svc, i, bodies[i])
+            ok = sum(1 for r in results.values() if r["ok"])
+            yield {"type": "progress", "attempt": attempt, "done": len(results), "total": total,
+                   "ok": ok, "failed": len(results) - ok, "retrying": len(retry)}
+        pending = sorted(retry)
+        if pending:
+            attempt += 1
+            time.sleep(min(30.0, 1.0 * (2 ** (attempt - 1))))
+
+    if any(r["ok"] for r in results.values()):
+        _mark_stale(token_path)
+    ordered = [results[i] for i in sorted(results)]
+    yield {"type": "result", "total": total,
+           "created": [r for r in ordered if r["ok"]],
+           "failed": [r for r in ordered if not r["ok"]]}
+
+def add_events_batch(events: List[Dict[str, Any]], tz_str: str = TZ_DEFAULT, **kw) -> Dict[str, Any]:
+    """Non-streaming wrapper: returns the final {"created": [...], "failed": [...]}."""
+    out: Dict[str, Any] = {}
+    for msg in iter_add_events_batch(events, tz_str, **kw):
+        out = msg
+    return out
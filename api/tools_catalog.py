@@ -1,44 +1,28 @@
-import os, re, requests, json, time
+import os, re
 from typing import List, Dict, Any, Optional
 from datetime import date, datetime
 
+from api import http_client
+from api.cache import TieredCache
+
 class CatalogError(Exception): ...
 
-# ── Simple file cache to save free calls ────────────────────────────────────────
+# ── Cache to save free calls (memory LRU + bounded disk tier) ──────────────────
 _CACHE_DIR = "data/.cache_catalog"
 _CACHE_TTL_SEC = int(os.getenv("CATALOG_CACHE_TTL_SEC", "86400"))  # 24h default
-
-def _ensure_cache_dir():
-    try:
-        os.makedirs(_CACHE_DIR, exist_ok=True)
-    except Exception:
-        pass
+_CACHE = TieredCache("catalog", _CACHE_DIR, _CACHE_TTL_SEC,
+                     max_entries=int(os.getenv("CATALOG_CACHE_MAX_ENTRIES", "2000")),
+                     max_bytes=int(float(os.getenv("CATALOG_CACHE_MAX_MB", "50")) * 1024 * 1024))
 
 def _cache_key(provider: str, q: str, budget: Optional[float], deadline_iso: Optional[str],
                prime_only: bool, zip_code: Optional[str]) -> str:
     return re.sub(r"[^a-z0-9._-]+", "_", f"{provider}|{q}|{budget}|{deadline_iso}|{prime_only}|{zip_code}").lower()
 
 def _cache_get(key: str) -> Optional[List[Dict[str, Any]]]:
-    _ensure_cache_dir()
-    path = os.path.join(_CACHE_DIR, key + ".json")
-    if not os.path.exists(path):
-        return None
-    try:
-        if time.time() - os.path.getmtime(path) > _CACHE_TTL_SEC:
-            return None
-        with open(path, "r") as f:
-            return json.load(f)
-    except Exception:
-        return None
+    return _CACHE.get(key)
 
 def _cache_set(key: str, value: List[Dict[str, Any]]):
-    _ensure_cache_dir()
-    path = os.path.join(_CACHE_DIR, key + ".json")
-    try:
-        with open(path, "w") as f:
-            json.dump(value, f)
-    except Exception:
-        pass
+    _CACHE.set(key, value)
 # ───────────────────────────────────────────────────────────────────────────────
 
 def _norm_price(s: Any) -> Optional[float]:
@@ -66,6 +50,24 @@ def _delivery_days_from_est(d: Optional[str]) -> Optional[int]:
     except Exception:
         return None
 
+RAINFOREST = "https://api.rainforestapi.com/request"
+
+def _prepare(query: str, budget: Optional[float], deadline_iso: Optional[str],
+             prime_only: bool, zip_code: Optional[str]) -> tuple[str, Dict[str, Any]]:
+    """Returns (cache key, Rainforest params)."""
+    provider = "rainforest"  # locked to Rainforest for your build
+    key = os.getenv("RAINFOREST_API_KEY")
+    if not key:
+        raise CatalogError("missing_rainforest_key")
+    cache_k = _cache_key(provider, query, budget, deadline_iso, prime_only, zip_code)
+    params = {
+        "api_key": key,
+        "type": "search",
+        "amazon_domain": "amazon.com",
+        "search_term": query,
+    }
+    return cache_k, params
+
 def search_products(query: str,
                     budget: Optional[float] = None,
                     deadline_iso: Optional[str] = None,
@@ -76,29 +78,41 @@ def search_products(query: str,
     Rainforest API → normalized list:
     {asin,title,price,prime,delivery_days,rating,reviews,image,url}
     """
-    provider = "rainforest"  # locked to Rainforest for your build
-    key = os.getenv("RAINFOREST_API_KEY")
-    if not key:
-        raise CatalogError("missing_rainforest_key")
+    cache_k, params = _prepare(query, budget, deadline_iso, prime_only, zip_code)
 
     # cache guard
-    cache_k = _cache_key(provider, query, budget, deadline_iso, prime_only, zip_code)
     cached = _cache_get(cache_k)
     if cached is not None:
         return cached
 
     # call Rainforest
-    params = {
-        "api_key": key,
-        "type": "search",
-        "amazon_domain": "amazon.com",
-        "search_term": query,
-    }
-    r = requests.get("https://api.rainforestapi.com/request", params=params, timeout=12)
+    r = http_client.get(RAINFOREST, params=params, timeout=12)
+    if r.status_code != 200:
+        raise CatalogError(f"rainforest_http_{r.status_code}")
+    final = _normalize(r.json(), budget, deadline_iso, prime_only)
+    _cache_set(cache_k, final)
+    return final
+
+async def asearch_products(query: str,
+                           budget: Optional[float] = None,
+                           deadline_iso: Optional[str] = None,
+                           prime_only: bool = True,
+                           provider: Optional[str] = None,
+                           zip_code: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Async twin of search_products (same cache)."""
+    cache_k, params = _prepare(query, budget, deadline_iso, prime_only, zip_code)
+    cached = _cache_get(cache_k)
+    if cached is not None:
+        return cached
+    r = await http_client.aget(RAINFOREST, params=params, timeout=12)
     if r.status_code != 200:
         raise CatalogError(f"rainforest_http_{r.status_code}")
-    data = r.json()
+    final = _normalize(r.json(), budget, deadline_iso, prime_only)
+    _cache_set(cache_k, final)
+    return final
 
+def _normalize(data: Dict[str, Any], budget: Optional[float], deadline_iso: Optional[str],
+               prime_only: bool) -> List[Dict[str, Any]]:
     deadline_days = _days_until(deadline_iso)
     results = (data.get("search_results") or [])[:25]
     items: List[Dict[str, Any]] = []
@@ -183,6 +197,4 @@ def search_products(query: str,
         if key_ not in dedup:
             dedup[key_] = p
 
-    final = list(dedup.values())[:20]
-    _cache_set(cache_k, final)
-    return final
\ No newline at end of file
+    return list(dedup.values())[:20]
\ No newline at end of file
@@ -1,9 +1,11 @@
 import os
 import time
-import requests
 import datetime as dt
 from typing import Dict, Any, Tuple, List
 
+from api import http_client
+from api.cache import SWRCache
+
 MAPBOX_BASE = "https://api.mapbox.com/directions/v5/mapbox/driving-traffic"
 
 class CommuteError(Exception):
@@ -23,22 +25,10 @@ def _pick_routes(json_: Dict[str, Any]) -> List[Dict[str, Any]]:
     routes = sorted(routes, key=lambda r: r.get("duration", 9e9))
     return routes[:3]
 
-def get_commute(home: Dict[str, float],
-                office: Dict[str, float],
-                arrive_by_hhmm: str,
-                buffer_minutes: int,
-                reroute_threshold_min: int = 8) -> Tuple[Dict[str, Any], int]:
-    """
-    Calls Mapbox 'driving-traffic' with alternatives, computes ETA and leave-by,
-    and recommends reroute if an alternate saves >= reroute_threshold_min minutes.
-    Returns (payload, latency_ms).
-    """
+def _route_request(home: Dict[str, float], office: Dict[str, float]) -> Tuple[str, Dict[str, Any]]:
     token = os.getenv("MAPBOX_TOKEN")
     if not token:
         raise CommuteError("missing_mapbox_token")
-
-    start = time.perf_counter()
-
     coords = f"{home['lon']},{home['lat']};{office['lon']},{office['lat']}"
     params = {
         "alternatives": "true",
@@ -47,10 +37,12 @@ def get_commute(home: Dict[str, float],
         "access_token": token,
         # annotations not strictly needed for ETA
     }
-    r = requests.get(f"{MAPBOX_BASE}/{coords}", params=params, timeout=12)
-    if r.status_code != 200:
-        raise CommuteError(f"mapbox_http_{r.status_code}")
-    data = r.json()
+    return f"{MAPBOX_BASE}/{coords}", params
+
+def _summarize(data: Dict[str, Any],
+               arrive_by_hhmm: str,
+               buffer_minutes: int,
+               reroute_threshold_min: int) -> Dict[str, Any]:
     routes = _pick_routes(data)
     if not routes:
         raise CommuteError("no_routes_found")
@@ -70,7 +62,7 @@ def get_commute(home: Dict[str, float],
     arrive_dt = _today_at(arrive_by_hhmm)
     leave_by = arrive_dt - dt.timedelta(minutes=eta_min + buffer_minutes)
 
-    payload = {
+    return {
         "eta_min": eta_min,
         "leave_by": _fmt_hhmm(leave_by),
         "arrive_by": arrive_by_hhmm,
@@ -80,5 +72,64 @@ def get_commute(home: Dict[str, float],
             "alt_save_min": alt_save_min,
         }
     }
+
+# Stale-while-revalidate: traffic moves, so the soft TTL is short; stale ETAs are still
+# served instantly while one refresh runs.
+_SWR = SWRCache("commute",
+                soft_ttl_sec=float(os.getenv("COMMUTE_SOFT_TTL_SEC", "120")),
+                hard_ttl_sec=float(os.getenv("COMMUTE_HARD_TTL_SEC", "900")))
+
+def _swr_key(home: Dict[str, float], office: Dict[str, float], arrive_by_hhmm: str,
+             buffer_minutes: int, reroute_threshold_min: int) -> str:
+    # ~100 m cells + the inputs that shape leave_by + local day bucket
+    pts = f"{round(home['lat'], 3)},{round(home['lon'], 3)};{round(office['lat'], 3)},{round(office['lon'], 3)}"
+    return f"{pts}:{arrive_by_hhmm}:{buffer_minutes}:{reroute_threshold_min}:{time.strftime('%Y%m%d')}"
+
+def _fetch(home, office, arrive_by_hhmm, buffer_minutes, reroute_threshold_min) -> Dict[str, Any]:
+    url, params = _route_request(home, office)
+    r = http_client.get(url, params=params, timeout=12)
+    if r.status_code != 200:
+        raise CommuteError(f"mapbox_http_{r.status_code}")
+    return _summarize(r.json(), arrive_by_hhmm, buffer_minutes, reroute_threshold_min)
+
+async def _afetch(home, office, arrive_by_hhmm, buffer_minutes, reroute_threshold_min) -> Dict[str, Any]:
+    url, params = _route_request(home, office)
+    r = await http_client.aget(url, params=params, timeout=12)
+    if r.status_code != 200:
+        raise CommuteError(f"mapbox_http_{r.status_code}")
+    return _summarize(r.json(), arrive_by_hhmm, buffer_minutes, reroute_threshold_min)
+
+def get_commute(home: Dict[str, float],
+                office: Dict[str, float],
+                arrive_by_hhmm: str,
+                buffer_minutes: int,
+                reroute_threshold_min: int = 8,
+                fresh: bool = False) -> Tuple[Dict[str, Any], int]:
+    """
+    Calls Mapbox 'driving-traffic' with alternatives, computes ETA and leave-by,
+    and recommends reroute if an alternate saves >= reroute_threshold_min minutes.
+    Served through the SWR cache unless fresh=True; payload["cache"] tells which.
+    Returns (payload, latency_ms).
+    """
+    args = (home, office, arrive_by_hhmm, buffer_minutes, reroute_threshold_min)
+    start = time.perf_counter()
+    if fresh:
+        payload, state = _fetch(*args), "bypass"
+    else:
+        payload, state = _SWR.get(_swr_key(*args), lambda: _fetch(*args))
+    payload["cache"] = state
+    latency_ms = int((time.perf_counter() - start) * 1000)
+    return payload, latency_ms
+
+async def aget_commute(home: Dict[str, float],
+                       office: Dict[str, float],
+                       arrive_by_hhmm: str,
+                       buffer_minutes: int,
+                       reroute_threshold_min: int = 8) -> Tuple[Dict[str, Any], int]:
+    """Async twin of get_commute."""
+    args = (home, office, arrive_by_hhmm, buffer_minutes, reroute_threshold_min)
+    start = time.perf_counter()
+    payload, state = await _SWR.aget(_swr_key(*args), lambda: _afetch(*args))
+    payload["cache"] = state
     latency_ms = int((time.perf_counter() - start) * 1000)
-    return payload, latency_ms
\ No newline at end of file
+    return payload, latency_ms
@@ -1,7 +1,8 @@
 import os, json, time, math, hashlib
-import requests
 from typing import Dict, Any, List, Tuple, Optional
 
+from api import http_client
+
 MAPBOX_BASE = "https://api.mapbox.com/directions/v5/mapbox/driving-traffic"
 YELP_BASE   = "https://api.yelp.com/v3/businesses/search"
 
@@ -47,7 +48,7 @@ def _mapbox_route(home: Dict[str, float], office: Dict[str, float]) -> Dict[str,
         "steps": "false",
         "access_token": token
     }
-    r = requests.get(f"{MAPBOX_BASE}/{coords}", params=params, timeout=12)
+    r = http_client.get(f"{MAPBOX_BASE}/{coords}", params=params, timeout=12)
     r.raise_for_status()
     data = r.json()
     routes = data.get("routes", [])
@@ -93,7 +94,7 @@ def _yelp_search(lat: float, lon: float, term: str, radius_m: int = 800, limit:
         "open_now": False,  # we’ll show open status if present
         "sort_by": "best_match"
     }
-    r = requests.get(YELP_BASE, headers=headers, params=params, timeout=10)
+    r = http_client.get(YELP_BASE, headers=headers, params=params, timeout=10)
     r.raise_for_status()
     data = r.json()
     out = []
@@ -118,9 +119,9 @@ def _detour_minutes(home: Dict[str, float], office: Dict[str, float], place: Dic
     coords_leg1   = f"{home['lon']},{home['lat']};{place['lon']},{place['lat']}"
     coords_leg2   = f"{place['lon']},{place['lat']};{office['lon']},{office['lat']}"
     p = {"access_token": token, "overview": "false", "steps": "false"}
-    d = requests.get(f"{MAPBOX_BASE}/{coords_direct}", params=p, timeout=10).json()
-    l1= requests.get(f"{MAPBOX_BASE}/{coords_leg1}",   params=p, timeout=10).json()
-    l2= requests.get(f"{MAPBOX_BASE}/{coords_leg2}",   params=p, timeout=10).json()
+    d = http_client.get(f"{MAPBOX_BASE}/{coords_direct}", params=p, timeout=10).json()
+    l1= http_client.get(f"{MAPBOX_BASE}/{coords_leg1}",   params=p, timeout=10).json()
+    l2= http_client.get(f"{MAPBOX_BASE}/{coords_leg2}",   params=p, timeout=10).json()
     t_direct = (d.get("routes",[{}])[0].get("duration") or 0)/60
     t_with   = ((l1.get("routes",[{}])[0].get("duration") or 0) + (l2.get("routes",[{}])[0].get("duration") or 0))/60
     detour = max(0, round(t_with - t_direct))
@@ -1,42 +1,58 @@
-import os, json, time, math, hashlib
-import requests
+import os, json, math, hashlib
 from typing import Dict, Any, List, Tuple, Optional
 
+from api import http_client, poi_index, geo
+from api.cache import TieredCache
+
 MAPBOX_BASE = "https://api.mapbox.com/directions/v5/mapbox/driving-traffic"
+MAPBOX_MATRIX = "https://api.mapbox.com/directions-matrix/v1/mapbox/driving-traffic"
 OVERPASS = "https://overpass-api.de/api/interpreter"
 
 _CACHE_DIR = "data/.cache_places"
 _CACHE_TTL_SEC = int(os.getenv("PLACES_CACHE_TTL_SEC", "900"))  # 15 min
 
+# driving-traffic matrix accepts at most 10 coordinates → home + office + 8 candidates
+_MATRIX_MAX_PLACES = 8
+# Offline/test stub for route + matrix: straight line × road factor at a fixed speed, no Mapbox calls
+_MAPBOX_STUB = os.getenv("MAPBOX_STUB", "false").lower() == "true"
+_STUB_SPEED_KMH = float(os.getenv("MAPBOX_STUB_KMH", "40"))
+_STUB_ROAD_FACTOR = 1.3
+
+_CORRIDOR_RADIUS_M = 800
+_DETOUR_CANDIDATES = 6  # best-ranked candidates that get a real (matrix) detour
+
 class PlacesError(Exception): ...
 
-def _ensure_cache_dir():
-    os.makedirs(_CACHE_DIR, exist_ok=True)
+_CACHE = TieredCache("places", _CACHE_DIR, _CACHE_TTL_SEC,
+                     max_entries=int(os.getenv("PLACES_CACHE_MAX_ENTRIES", "1000")),
+                     max_bytes=int(float(os.getenv("PLACES_CACHE_MAX_MB", "20")) * 1024 * 1024))
 
 def _cache_key(**kwargs) -> str:
     raw = json.dumps(kwargs, sort_keys=True)
-    h = hashlib.sha1(raw.encode()).hexdigest()[:16]
-    return os.path.join(_CACHE_DIR, f"{h}.json")
-
-def _cache_get(key_path: str) -> Optional[Any]:
-    _ensure_cache_dir()
-    if not os.path.exists(key_path): return None
-    if time.time() - os.path.getmtime(key_path) > _CACHE_TTL_SEC: return None
-    try:
-        with open(key_path, "r") as f:
-            return json.load(f)
-    except Exception:
-        return None
-
-def _cache_set(key_path: str, value: Any):
-    _ensure_cache_dir()
-    try:
-        with open(key_path, "w") as f:
-            json.dump(value, f)
-    except Exception:
-        pass
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+def _cache_get(key: str) -> Optional[Any]:
+    return _CACHE.get(key)
+
+def _cache_set(key: str, value: Any):
+    _CACHE.set(key, value)
+
+def _haversine_km(lon1, lat1, lon2, lat2) -> float:
+    R = 6371.0
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi/2)**2 + math.cos(p1)*math.cos(p2)*math.sin(dlmb/2)**2
+    return 2*R*math.asin(math.sqrt(a))
+
+def _stub_duration_sec(a: Dict[str, float], b: Dict[str, float]) -> float:
+    km = _haversine_km(a["lon"], a["lat"], b["lon"], b["lat"]) * _STUB_ROAD_FACTOR
+    return km / _STUB_SPEED_KMH * 3600
 
 def _mapbox_route(home: Dict[str, float], office: Dict[str, float]) -> Dict[str, Any]:
+    if _MAPBOX_STUB:
+        return {"duration": _stub_duration_sec(home, office),
+                "geometry": {"coordinates": [[home["lon"], home["lat"]], [office["lon"], office["lat"]]]}}
     token = os.getenv("MAPBOX_TOKEN")
     if not token: raise PlacesError("missing_mapbox_token")
     coords = f"{home['lon']},{home['lat']};{office['lon']},{office['lat']}"
@@ -47,7 +63,7 @@ def _mapbox_route(home: Dict[str, float], office: Dict[str, float]) -> Dict[str,
         "steps": "false",
         "access_token": token
     }
-    r = requests.get(f"{MAPBOX_BASE}/{coords}", params=params, timeout=12)
+    r = http_client.get(f"{MAPBOX_BASE}/{coords}", params=params, timeout=12)
     r.raise_for_status()
     data = r.json()
     routes = data.get("routes", [])
@@ -56,29 +72,7 @@ def _mapbox_route(home: Dict[str, float], office: Dict[str, float]) -> Dict[str,
 
 def _sample_points(geojson_coords: List[List[float]], every_km: float = 2.0, max_points: int = 6) -> List[Tuple[float, float]]:
     """Downsample route (lon,lat) pairs ~every_km; cap to max_points. Returns (lat,lon)."""
-    out: List[Tuple[float, float]] = []
-    if not geojson_coords: return out
-    def haversine(lon1, lat1, lon2, lat2):
-        R = 6371.0
-        p1, p2 = math.radians(lat1), math.radians(lat2)
-        dphi = math.radians(lat2 - lat1)
-        dlmb = math.radians(lon2 - lon1)
-        a = math.sin(dphi/2)**2 + math.cos(p1)*math.cos(p2)*math.sin(dlmb/2)**2
-        return 2*R*math.asin(math.sqrt(a))
-    acc = 0.0
-    last = geojson_coords[0]
-    out.append((last[1], last[0]))
-    for xy in geojson_coords[1:]:
-        d = haversine(last[0], last[1], xy[0], xy[1])
-        acc += d
-        if acc >= every_km:
-            out.append((xy[1], xy[0]))
-            acc = 0.0
-        last = xy
-        if len(out) >= max_points: break
-    if out[-1] != (geojson_coords[-1][1], geojson_coords[-1][0]):
-        out[-1] = (geojson_coords[-1][1], geojson_coords[-1][0])
-    return out
+    return geo.sample_points(geojson_coords, every_km=every_km, max_points=max_points)
 
 # ------- OSM category mapping (free) -------
 _OSM_FILTERS = {
@@ -96,35 +90,34 @@ _OSM_FILTERS = {
     ]
 }
 
-def _overpass_query(lat: float, lon: float, radius_m: int, filters: List[str]) -> str:
-    around = f'(around:{radius_m},{lat},{lon})'
+def _overpass_query(points: List[Tuple[float, float]], radius_m: int, filters: List[str]) -> str:
+    # around with several coordinates buffers the polyline through them → whole route in one query
+    coords = ",".join(f"{lat:.6f},{lon:.6f}" for lat, lon in points)
+    around = f'(around:{radius_m},{coords})'
     # Search nodes + ways (with center) for each filter
     parts = []
     for f in filters:
         parts.append(f'node[{f}]{around};')
         parts.append(f'way[{f}]{around};')
     body = "".join(parts)
-    return f'[out:json][timeout:25];({body});out center 20;'
+    # no result cap: Overpass returns id order, not distance, so a cap drops arbitrary
+    # places along the route; the corridor filter trims candidates client-side
+    return f'[out:json][timeout:25];({body});out center;'
 
-def _osm_search(lat: float, lon: float, category: str, radius_m: int = 800) -> List[Dict[str, Any]]:
-    filters = _OSM_FILTERS.get(category.lower())
-    if not filters:
-        # fallback: treat as text search on name (coarse)
-        filters = [f'name~"{category}",i']
-    q = _overpass_query(lat, lon, radius_m, filters)
-    r = requests.post(OVERPASS, data={"data": q}, timeout=25)
-    r.raise_for_status()
-    data = r.json()
-    out = []
-    for el in data.get("elements", []):
+def _parse_elements(elements: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Overpass elements → place dicts, deduplicated by OSM id."""
+    out: Dict[str, Dict[str, Any]] = {}
+    for el in elements:
         tags = el.get("tags", {})
         name = tags.get("name")
         if not name: continue
+        pid = f"{el.get('type')}/{el.get('id')}"
+        if pid in out: continue
         phone = tags.get("contact:phone") or tags.get("phone")
         lat_c = el.get("lat") or (el.get("center") or {}).get("lat")
         lon_c = el.get("lon") or (el.get("center") or {}).get("lon")
-        out.append({
-            "id": f"{el.get('type')}/{el.get('id')}",
+        out[pid] = {
+            "id": pid,
             "name": name,
             "phone": phone,
             "address": ", ".join([t for t in [
@@ -136,22 +129,82 @@ def _osm_search(lat: float, lon: float, category: str, radius_m: int = 800) -> L
             "lon": lon_c,
             "url": tags.get("website") or tags.get("contact:website"),
             "tags": tags
-        })
-    return out
+        }
+    return list(out.values())
 
-def _detour_minutes(home: Dict[str, float], office: Dict[str, float], place: Dict[str, float]) -> int:
+def _category_filters(category: str) -> List[str]:
+    filters = _OSM_FILTERS.get(category.lower())
+    if not filters:
+        # fallback: treat as text search on name (coarse)
+        filters = [f'name~"{category}",i']
+    return filters
+
+def _osm_search(points: List[Tuple[float, float]], category: str, radius_m: int = 800) -> List[Dict[str, Any]]:
+    """One Overpass round trip for all sampled route points."""
+    if not points:
+        return []
+    q = _overpass_query(points, radius_m, _category_filters(category))
+    r = http_client.post(OVERPASS, data={"data": q}, timeout=25)
+    r.raise_for_status()
+    return _parse_elements(r.json().get("elements", []))
+
+def _leg_durations(home: Dict[str, float], office: Dict[str, float],
+                   places: List[Dict[str, float]]) -> Tuple[List[Optional[float]], List[Optional[float]]]:
+    """
+    Seconds home→place and place→office for every candidate in ONE Matrix request:
+    coordinates = [home, p1..pn, office], sources = home+places, destinations = places+office.
+    """
+    n = len(places)
+    if _MAPBOX_STUB:
+        return ([_stub_duration_sec(home, p) for p in places],
+                [_stub_duration_sec(p, office) for p in places])
     token = os.getenv("MAPBOX_TOKEN")
     if not token: raise PlacesError("missing_mapbox_token")
-    coords_direct = f"{home['lon']},{home['lat']};{office['lon']},{office['lat']}"
-    coords_leg1   = f"{home['lon']},{home['lat']};{place['lon']},{place['lat']}"
-    coords_leg2   = f"{place['lon']},{place['lat']};{office['lon']},{office['lat']}"
-    p = {"access_token": token, "overview": "false", "steps": "false"}
-    d = requests.get(f"{MAPBOX_BASE}/{coords_direct}", params=p, timeout=10).json()
-    l1= requests.get(f"{MAPBOX_BASE}/{coords_leg1}",   params=p, timeout=10).json()
-    l2= requests.get(f"{MAPBOX_BASE}/{coords_leg2}",   params=p, timeout=10).json()
-    t_direct = (d.get("routes",[{}])[0].get("duration") or 0)/60
-    t_with   = ((l1.get("routes",[{}])[0].get("duration") or 0) + (l2.get("routes",[{}])[0].get("duration") or 0))/60
-    return max(0, round(t_with - t_direct))
+    pts = [home, *places, office]
+    coords = ";".join(f"{p['lon']},{p['lat']}" for p in pts)
+    params = {
+        "sources": ";".join(str(i) for i in range(0, n + 1)),
+        "destinations": ";".join(str(i) for i in range(1, n + 2)),
+        "annotations": "duration",
+        "access_token": token,
+    }
+    r = http_client.get(f"{MAPBOX_MATRIX}/{coords}", params=params, timeout=12)
+    r.raise_for_status()
+    durs = r.json().get("durations") or []
+    if len(durs) != n + 1:
+        raise PlacesError("bad_matrix_response")
+    # row 0 = from home, rows 1..n = from places; column n = to office
+    to_place  = [durs[0][i] for i in range(n)]
+    to_office = [durs[i + 1][n] for i in range(n)]
+    return to_place, to_office
+
+def _detour_minutes(home: Dict[str, float], office: Dict[str, float],
+                    places: List[Dict[str, float]], direct_sec: float) -> List[Optional[int]]:
+    """Detour per candidate vs. the direct route duration we already have from _mapbox_route."""
+    if not places:
+        return []
+    to_place, to_office = _leg_durations(home, office, places[:_MATRIX_MAX_PLACES])
+    out: List[Optional[int]] = []
+    for a, b in zip(to_place, to_office):
+        if a is None or b is None:  # Mapbox returns null for unroutable pairs
+            out.append(None)
+            continue
+        out.append(max(0, round((a + b - direct_sec) / 60)))
+    return out
+
+def _rank_by_corridor(places: List[Dict[str, Any]], line: List[Tuple[float, float]]) -> List[Dict[str, Any]]:
+    """
+    Rank all candidates at once by estimated detour (perpendicular distance to the
+    full route polyline), earliest along the route first on ties; drop ones outside the corridor.
+    """
+    if not places:
+        return []
+    dist_m, along_m = geo.corridor([(p["lat"], p["lon"]) for p in places], line)
+    est = geo.estimate_detour_sec(dist_m)
+    # Overpass "around" over sparse samples can reach slightly past the true corridor
+    keep = [i for i in range(len(places)) if dist_m[i] <= _CORRIDOR_RADIUS_M * 1.5]
+    keep.sort(key=lambda i: (round(est[i] / 60), along_m[i]))
+    return [places[i] for i in keep]
 
 def search_along_route(category: str, home: Dict[str, float], office: Dict[str, float]) -> List[Dict[str, Any]]:
     """Return top places along route ranked by minimal detour. Free sources only."""
@@ -159,30 +212,33 @@ def search_along_route(category: str, home: Dict[str, float], office: Dict[str,
         raise PlacesError("empty_category")
     route = _mapbox_route(home, office)
     coords = route.get("geometry", {}).get("coordinates", [])
-    samples = _sample_points(coords, every_km=2.0, max_points=6)
+    # one Overpass query now covers every sample, so sample the route more densely
+    samples = _sample_points(coords, every_km=1.0, max_points=30)
 
     cache_k = _cache_key(category=category, home=home, office=office, samples=samples)
     cached = _cache_get(cache_k)
     if cached is not None:
         return cached
 
-    # Gather candidates near each sampled point
-    raw: Dict[str, Dict[str, Any]] = {}
-    for (lat, lon) in samples:
+    # Local POI index first (full route geometry); Overpass only when the route isn't covered
+    line = [(c[1], c[0]) for c in coords]
+    found = poi_index.lookup(category, line, radius_m=_CORRIDOR_RADIUS_M)
+    if found is None:
+        # Gather candidates along the whole route in a single round trip
         try:
-            found = _osm_search(lat, lon, category, radius_m=800)
-            for p in found:
-                if not p.get("id"): continue
-                raw[p["id"]] = p
+            found = _osm_search(samples, category, radius_m=_CORRIDOR_RADIUS_M)
         except Exception:
-            continue
+            return []  # don't cache an Overpass outage as "nothing nearby"
+    raw = {p["id"]: p for p in found}
 
-    # Take up to 6 for detour calc
-    candidates = list(raw.values())[:6]
+    candidates = _rank_by_corridor([p for p in raw.values() if p.get("lat") is not None and p.get("lon") is not None],
+                                   line or [(home["lat"], home["lon"]), (office["lat"], office["lon"])])
+    candidates = candidates[:_DETOUR_CANDIDATES]
+    direct_sec = float(route.get("duration") or 0)
+    detours = _detour_minutes(home, office, [{"lat": p["lat"], "lon": p["lon"]} for p in candidates], direct_sec)
     results: List[Dict[str, Any]] = []
-    for p in candidates:
-        if p.get("lat") is None or p.get("lon") is None: continue
-        detour = _detour_minutes(home, office, {"lat": p["lat"], "lon": p["lon"]})
+    for p, detour in zip(candidates, detours):
+        if detour is None: continue
         results.append({
             "name": p["name"],
             "phone": p.get("phone"),
@@ -195,4 +251,8 @@ def search_along_route(category: str, home: Dict[str, float], office: Dict[str,
     results.sort(key=lambda x: (x["detour_min"], x.get("name","")))
     final = results[:3]
     _cache_set(cache_k, final)
-    return final
\ No newline at end of file
+    return final
+
+async def asearch_along_route(category: str, home: Dict[str, float], office: Dict[str, float]) -> List[Dict[str, Any]]:
+    """Async entry point: the multi-call pipeline runs on a worker thread under the "places" limit."""
+    return await http_client.run_limited("places", search_along_route, category, home, office)
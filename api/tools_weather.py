@@ -1,7 +1,10 @@
+import os
 import time
-import requests
 from typing import Dict, List, Any, Tuple
 
+from api import http_client
+from api.cache import SWRCache
+
 def _pick_next_6(hourly: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
     # Open-Meteo returns arrays aligned by index
     times = hourly.get("time", [])[:6]
@@ -18,11 +21,9 @@ def _pick_next_6(hourly: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
         })
     return out
 
-def get_weather(lat: float, lon: float, use_fahrenheit: bool = True) -> Tuple[Dict[str, Any], int]:
-    """
-    Calls Open-Meteo and returns a compact dict + latency_ms.
-    """
-    start = time.perf_counter()
+OPEN_METEO = "https://api.open-meteo.com/v1/forecast"
+
+def _params(lat: float, lon: float, use_fahrenheit: bool) -> Dict[str, Any]:
     params = {
         "latitude": lat,
         "longitude": lon,
@@ -32,18 +33,51 @@ def get_weather(lat: float, lon: float, use_fahrenheit: bool = True) -> Tuple[Di
     }
     if use_fahrenheit:
         params["temperature_unit"] = "fahrenheit"
+    return params
 
-    r = requests.get("https://api.open-meteo.com/v1/forecast", params=params, timeout=10)
-    r.raise_for_status()
-    data = r.json()
-
+def _compact(data: Dict[str, Any]) -> Dict[str, Any]:
     current = data.get("current", {})
     hourly  = data.get("hourly", {})
-
-    result = {
+    return {
         "temp_now": round(float(current.get("temperature_2m")), 1) if current.get("temperature_2m") is not None else None,
         "uv_now":   round(float(current.get("uv_index")),       1) if current.get("uv_index")       is not None else None,
         "hourly":   _pick_next_6(hourly)
     }
+
+# Stale-while-revalidate: serve cached forecasts instantly, refresh in the background once stale.
+_SWR = SWRCache("weather",
+                soft_ttl_sec=float(os.getenv("WEATHER_SOFT_TTL_SEC", "600")),
+                hard_ttl_sec=float(os.getenv("WEATHER_HARD_TTL_SEC", "3600")))
+
+def _swr_key(lat: float, lon: float, use_fahrenheit: bool) -> str:
+    # ~1 km cell + unit + local day bucket
+    return f"{round(lat, 2)}:{round(lon, 2)}:{'F' if use_fahrenheit else 'C'}:{time.strftime('%Y%m%d')}"
+
+def _fetch(lat: float, lon: float, use_fahrenheit: bool) -> Dict[str, Any]:
+    r = http_client.get(OPEN_METEO, params=_params(lat, lon, use_fahrenheit), timeout=10)
+    r.raise_for_status()
+    return _compact(r.json())
+
+async def _afetch(lat: float, lon: float, use_fahrenheit: bool) -> Dict[str, Any]:
+    r = await http_client.aget(OPEN_METEO, params=_params(lat, lon, use_fahrenheit), timeout=10)
+    r.raise_for_status()
+    return _compact(r.json())
+
+def get_weather(lat: float, lon: float, use_fahrenheit: bool = True) -> Tuple[Dict[str, Any], int]:
+    """
+    Calls Open-Meteo (through the SWR cache) and returns a compact dict + latency_ms.
+    result["cache"] is "fresh", "stale" (refresh under way) or "miss".
+    """
+    start = time.perf_counter()
+    result, state = _SWR.get(_swr_key(lat, lon, use_fahrenheit), lambda: _fetch(lat, lon, use_fahrenheit))
+    result["cache"] = state
+    latency_ms = int((time.perf_counter() - start) * 1000)
+    return result, latency_ms
+
+async def aget_weather(lat: float, lon: float, use_fahrenheit: bool = True) -> Tuple[Dict[str, Any], int]:
+    """Async twin of get_weather (for the async endpoints)."""
+    start = time.perf_counter()
+    result, state = await _SWR.aget(_swr_key(lat, lon, use_fahrenheit), lambda: _afetch(lat, lon, use_fahrenheit))
+    result["cache"] = state
     latency_ms = int((time.perf_counter() - start) * 1000)
-    return result, latency_ms
\ No newline at end of file
+    return result, latency_ms
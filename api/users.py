@@ -0,0 +1,81 @@
+# api/users.py
+"""
+Per-user config store for the multi-user Daily Brief.
+
+One JSON file per user under USERS_DIR:
+    {"user_id": "...", "tz": "America/Phoenix",
+     "profile": {"lat": .., "lon": .., ...},
+     "commute": {"home": {lat,lon}, "office": {lat,lon}, "arrive_by": "HH:MM", "buffer_minutes": 10},
+     "brief":   {"time": "HH:MM", "enabled": true}}
+The user's Google token lives next to it (<user_id>.google_token.json).
+"""
+import os, re, json, hashlib, threading
+from typing import Any, Dict, List, Optional
+
+USERS_DIR = os.getenv("USERS_DIR", "data/users")
+BRIEF_SPREAD_SEC = int(os.getenv("BRIEF_SPREAD_SEC", "60"))  # spread same-minute briefs over this window
+
+_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+_lock = threading.Lock()
+
+def _check_id(user_id: str) -> str:
+    if not _ID_RE.match(user_id or ""):
+        raise ValueError(f"invalid_user_id: {user_id!r}")
+    return user_id
+
+def _path(user_id: str) -> str:
+    return os.path.join(USERS_DIR, f"{_check_id(user_id)}.json")
+
+def token_path(user_id: str) -> str:
+    return os.path.join(USERS_DIR, f"{_check_id(user_id)}.google_token.json")
+
+def get_user(user_id: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(_path(user_id)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def list_users() -> List[Dict[str, Any]]:
+    if not os.path.isdir(USERS_DIR):
+        return []
+    out = []
+    for name in sorted(os.listdir(USERS_DIR)):
+        # skip tokens and anything else that isn't a <user_id>.json config
+        if name.endswith(".json") and _ID_RE.match(name[:-5]):
+            u = get_user(name[:-5])
+            if u:
+                out.append(u)
+    return out
+
+def save_user(user_id: str, patch: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge patch (top-level sections replaced key by key) into the stored config."""
+    with _lock:
+        cur = get_user(user_id) or {"user_id": user_id}
+        for section in ("profile", "commute", "brief"):
+            if isinstance(patch.get(section), dict):
+                cur[section] = {**cur.get(section, {}), **patch[section]}
+        if patch.get("tz"):
+            cur["tz"] = patch["tz"]
+        cur["user_id"] = user_id
+        cur.setdefault("brief", {}).setdefault("enabled", True)
+        os.makedirs(USERS_DIR, exist_ok=True)
+        tmp = _path(user_id) + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(cur, f, indent=2)
+        os.replace(tmp, _path(user_id))
+        return cur
+
+def delete_user(user_id: str) -> bool:
+    with _lock:
+        try:
+            os.remove(_path(user_id))
+            return True
+        except FileNotFoundError:
+            return False
+
+def brief_offset_sec(user_id: str) -> int:
+    """Stable per-user second within the spread window, so 07:00 briefs don't all fire at :00."""
+    if BRIEF_SPREAD_SEC <= 1:
+        return 0
+    return int(hashlib.sha1(user_id.encode()).hexdigest()[:8], 16) % min(BRIEF_SPREAD_SEC, 60)